@@ -0,0 +1,63 @@
+"""
+Shared configuration for crypto scanner
+Loads .env once per process; every module reads settings from here
+"""
+
+import os
+import atexit
+import logging
+import logging.handlers
+import queue
+from dotenv import load_dotenv
+
+# Load environment variables from .env file (existing environment wins)
+load_dotenv()
+
+# Database connection
+DB_URL = os.getenv('DB_URL')
+
+# Telegram alerts
+TELEGRAM_BOT_TOKEN = os.getenv('TELEGRAM_BOT_TOKEN')
+TELEGRAM_CHAT_ID = os.getenv('TELEGRAM_CHAT_ID')
+
+# Tracked symbols: exchange format for ccxt, table-name format for the database
+SYMBOLS_CCXT = ('BTC/USDT', 'ETH/USDT', 'LTC/USDT', 'XRP/USDT',
+                'DOGE/USDT', 'LINK/USDT', 'ADA/USDT')
+SYMBOLS_DB = tuple(symbol.replace('/', '').lower() for symbol in SYMBOLS_CCXT)
+
+# Timeframes that produce support/resistance levels
+TIMEFRAMES_HL = ('daily', 'weekly', 'monthly')
+
+
+def setup_logger(name: str, log_file: str) -> logging.Logger:
+    """
+    Logger that writes to logs/<log_file> and the console
+    
+    Args:
+        name: Logger name, usually the module's __name__
+        log_file: File name inside logs/, e.g. 'level_filter.log'
+    
+    Returns:
+        Configured logger
+    """
+    os.makedirs('logs', exist_ok=True)
+    logger = logging.getLogger(name)
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+    
+    fh = logging.FileHandler(os.path.join('logs', log_file))
+    ch = logging.StreamHandler()
+    formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
+    fh.setFormatter(formatter)
+    ch.setFormatter(formatter)
+    
+    # File writes happen on a background listener thread: a log call only
+    # enqueues the record. stop() at exit drains the queue before logging shuts down
+    records = queue.Queue(-1)
+    listener = logging.handlers.QueueListener(records, fh, respect_handler_level=True)
+    listener.start()
+    atexit.register(listener.stop)
+    
+    logger.addHandler(logging.handlers.QueueHandler(records))
+    logger.addHandler(ch)
+    return logger
@@ -4,25 +4,71 @@ Database Schema Creation Script
 Creates all necessary tables for the crypto fakeout scanner
 """
 
+import argparse
+import sys
 import psycopg2
-import os
 from psycopg2 import sql
-import os
-from dotenv import load_dotenv
-
-# Load environment variables from .env file
-load_dotenv()
-
-# Database connection
-DB_URL = os.getenv('DB_URL')
+from config import DB_URL, SYMBOLS_DB
 
 # Configuration
-SYMBOLS = ['btcusdt', 'ethusdt', 'ltcusdt', 'xrpusdt', 'dogeusdt', 'linkusdt', 'adausdt']
+SYMBOLS = SYMBOLS_DB
 TIMEFRAMES = ['5m', '1h', '4h', '1d', '1w', '1M']
 
+# TimescaleDB chunk size per timeframe (keeps each chunk's index small)
+CHUNK_INTERVALS = {
+    '5m': '7 days',
+    '1h': '30 days',
+    '4h': '180 days',
+    '1d': '180 days',
+    '1w': '180 days',
+    '1M': '180 days'
+}
+
+
+def has_timescaledb(cursor):
+    """Check whether the TimescaleDB extension is installed in this database"""
+    cursor.execute("SELECT 1 FROM pg_extension WHERE extname = 'timescaledb'")
+    return cursor.fetchone() is not None
+
+
+def primary_key_has_timestamp(cursor, table_name):
+    """
+    Check whether a table's primary key includes the timestamp column
+    TimescaleDB refuses to partition a table whose unique indexes lack the time
+    column, as in tables created with the old id SERIAL PRIMARY KEY
+    """
+    cursor.execute("""
+        SELECT 1
+        FROM pg_index i
+        JOIN pg_attribute a ON a.attrelid = i.indrelid AND a.attnum = ANY(i.indkey)
+        WHERE i.indrelid = %s::regclass
+          AND i.indisprimary
+          AND a.attname = 'timestamp'
+    """, (f'"{table_name}"',))
+    return cursor.fetchone() is not None
+
 
-def create_ohlcv_table(cursor, symbol, timeframe):
-    """Create OHLCV table for a specific symbol and timeframe"""
+def create_hypertable(cursor, table_name, timeframe):
+    """Convert an OHLCV table into a TimescaleDB hypertable partitioned on timestamp"""
+    cursor.execute("""
+        SELECT create_hypertable(
+            %s::regclass, 'timestamp',
+            chunk_time_interval => %s::interval,
+            create_default_indexes => FALSE,
+            if_not_exists => TRUE,
+            migrate_data => TRUE
+        )
+    """, (f'"{table_name}"', CHUNK_INTERVALS[timeframe]))
+
+
+def create_ohlcv_table(cursor, symbol, timeframe, use_timescale=False):
+    """
+    Create OHLCV table for a specific symbol and timeframe
+    
+    Returns:
+        False if the table should have become a hypertable but was left as is
+        (its primary key predates the timestamp primary key), True otherwise
+    """
     
     table_name = f"{symbol}_{timeframe}"
     
@@ -40,8 +86,8 @@ def create_ohlcv_table(cursor, symbol, timeframe):
     
     query = sql.SQL("""
         CREATE TABLE IF NOT EXISTS {table} (
-            id SERIAL PRIMARY KEY,
-            timestamp TIMESTAMPTZ UNIQUE NOT NULL,
+            id SERIAL,
+            timestamp TIMESTAMPTZ PRIMARY KEY,
             open DOUBLE PRECISION NOT NULL,
             high DOUBLE PRECISION NOT NULL,
             low DOUBLE PRECISION NOT NULL,
@@ -53,26 +99,69 @@ def create_ohlcv_table(cursor, symbol, timeframe):
             {fakeout_columns}
             created_at TIMESTAMPTZ DEFAULT CURRENT_TIMESTAMP
         );
-        
-        CREATE INDEX IF NOT EXISTS {timestamp_idx} ON {table} (timestamp DESC);
     """).format(
         table=sql.Identifier(table_name),
-        fakeout_columns=fakeout_columns,
-        timestamp_idx=sql.Identifier(f"{table_name}_timestamp_idx")
+        fakeout_columns=fakeout_columns
     )
     
     cursor.execute(query)
     
-    # Create fakeout index separately if needed
-    if has_fakeout_columns:
+    print(f"✅ Created table: {table_name}")
+    
+    # Partition by time when TimescaleDB is available
+    if use_timescale:
+        if not primary_key_has_timestamp(cursor, table_name):
+            print(f"⚠️  Not converted to a hypertable: {table_name} (primary key lacks timestamp)")
+            return False
+        create_hypertable(cursor, table_name, timeframe)
+    
+    return True
+
+
+def create_ohlcv_indexes(cursor, symbol, timeframe):
+    """
+    Create secondary indexes for an OHLCV table
+    Run after the bulk load so inserts don't pay for index maintenance
+    """
+    
+    table_name = f"{symbol}_{timeframe}"
+    
+    # Replaced by the BRIN index below on databases created before it
+    cursor.execute(sql.SQL("DROP INDEX IF EXISTS {old_idx}").format(
+        old_idx=sql.Identifier(f"{table_name}_timestamp_idx")
+    ))
+    
+    # Rows arrive in time order, so a BRIN index covers range scans at a tiny
+    # fraction of a btree's size; ORDER BY timestamp ... LIMIT still uses the
+    # primary key btree
+    cursor.execute(sql.SQL("""
+        CREATE INDEX IF NOT EXISTS {timestamp_idx} ON {table}
+        USING BRIN (timestamp) WITH (pages_per_range = 32);
+    """).format(
+        timestamp_idx=sql.Identifier(f"{table_name}_timestamp_brin_idx"),
+        table=sql.Identifier(table_name)
+    ))
+    
+    # Fakeout index only on timeframes that have fakeout columns
+    if timeframe in ['1h', '4h', '1d']:
+        # Replaced by the covering index below on databases created before it
+        cursor.execute(sql.SQL("DROP INDEX IF EXISTS {old_idx}").format(
+            old_idx=sql.Identifier(f"{table_name}_fakeout_idx")
+        ))
+        
+        # Partial (fakeout rows only) and covering: the web UI's newest-first
+        # fakeout lists and id lookups become index-only scans of a tiny index
         cursor.execute(sql.SQL("""
-            CREATE INDEX IF NOT EXISTS {fakeout_idx} ON {table} (is_fakeout) WHERE is_fakeout = TRUE;
+            CREATE INDEX IF NOT EXISTS {fakeout_idx} ON {table} (timestamp DESC)
+            INCLUDE (id, open, high, low, close, volume, rsi_8, ema_20, ema_50, fakeout_type, fakeout_level)
+            WHERE is_fakeout = TRUE;
         """).format(
-            fakeout_idx=sql.Identifier(f"{table_name}_fakeout_idx"),
+            fakeout_idx=sql.Identifier(f"{table_name}_fakeout_ts_idx"),
             table=sql.Identifier(table_name)
         ))
     
-    print(f"✅ Created table: {table_name}")
+    # Fresh statistics for the planner after the load
+    cursor.execute(sql.SQL("ANALYZE {table}").format(table=sql.Identifier(table_name)))
 
 
 def create_filtered_levels_tables(cursor):
@@ -92,18 +181,19 @@ def create_filtered_levels_tables(cursor):
             );
         """).format(table=sql.Identifier(table_name)))
         
-        # Create indexes separately
-        cursor.execute(sql.SQL("""
-            CREATE INDEX IF NOT EXISTS {idx1} ON {table} (symbol, timeframe);
-        """).format(
-            idx1=sql.Identifier(f"{table_name}_symbol_timeframe_idx"),
-            table=sql.Identifier(table_name)
-        ))
+        # Replaced by the index below on databases created before it
+        for old_idx in ["symbol_timeframe_idx", "timestamp_idx", "sym_tf_ts_idx"]:
+            cursor.execute(sql.SQL("DROP INDEX IF EXISTS {old_idx}").format(
+                old_idx=sql.Identifier(f"{table_name}_{old_idx}")
+            ))
         
+        # One composite index serves both the symbol/timeframe filter and the
+        # level filter's (timestamp DESC, id DESC) window order, so that query
+        # reads presorted rows; INCLUDE (level) allows index-only scans
         cursor.execute(sql.SQL("""
-            CREATE INDEX IF NOT EXISTS {idx2} ON {table} (timestamp DESC);
+            CREATE INDEX IF NOT EXISTS {idx} ON {table} (symbol, timeframe, timestamp DESC, id DESC) INCLUDE (level);
         """).format(
-            idx2=sql.Identifier(f"{table_name}_timestamp_idx"),
+            idx=sql.Identifier(f"{table_name}_sym_tf_ts_id_idx"),
             table=sql.Identifier(table_name)
         ))
         
@@ -125,15 +215,30 @@ def create_all_tables():
         conn = psycopg2.connect(DB_URL)
         cursor = conn.cursor()
         
+        use_timescale = has_timescaledb(cursor)
+        
         # Create OHLCV tables
         print(f"\n📊 Creating OHLCV tables...")
         print(f"Symbols: {len(SYMBOLS)}, Timeframes: {len(TIMEFRAMES)}")
-        print(f"Total tables to create: {len(SYMBOLS) * len(TIMEFRAMES)}\n")
+        print(f"Total tables to create: {len(SYMBOLS) * len(TIMEFRAMES)}")
+        print(f"TimescaleDB hypertables: {'yes' if use_timescale else 'no (extension not installed)'}\n")
         
+        skipped = []
+        failed = []
         for symbol in SYMBOLS:
             print(f"\n🔸 {symbol.upper()}")
             for timeframe in TIMEFRAMES:
-                create_ohlcv_table(cursor, symbol, timeframe)
+                # One savepoint per table: a table that fails (e.g. a legacy table
+                # TimescaleDB rejects) rolls back alone, not the whole run
+                cursor.execute("SAVEPOINT ohlcv_table")
+                try:
+                    if not create_ohlcv_table(cursor, symbol, timeframe, use_timescale):
+                        skipped.append(f"{symbol}_{timeframe}")
+                    cursor.execute("RELEASE SAVEPOINT ohlcv_table")
+                except psycopg2.Error as e:
+                    cursor.execute("ROLLBACK TO SAVEPOINT ohlcv_table")
+                    failed.append(f"{symbol}_{timeframe}")
+                    print(f"❌ Error creating table {symbol}_{timeframe}: {e}")
         
         # Create filtered levels tables
         print(f"\n📈 Creating filtered levels tables...\n")
@@ -144,21 +249,65 @@ def create_all_tables():
         conn.close()
         
         print("\n" + "=" * 70)
-        print("✨ Database schema created successfully!")
+        if failed:
+            print(f"⚠️  Database schema created with {len(failed)} failed table(s)")
+        else:
+            print("✨ Database schema created successfully!")
         print("=" * 70)
         
         print(f"\n📊 Summary:")
         print(f"  • OHLCV tables: {len(SYMBOLS) * len(TIMEFRAMES)}")
         print(f"  • Filtered levels tables: 2 (high_levels, low_levels)")
         print(f"  • Total tables: {len(SYMBOLS) * len(TIMEFRAMES) + 2}")
+        if skipped:
+            print(f"  • Left as plain tables (old id primary key): {', '.join(skipped)}")
+        if failed:
+            print(f"  • Failed: {', '.join(failed)}")
         
-        return True
+        return not failed
         
     except Exception as e:
         print(f"\n❌ Error creating schema: {e}")
         return False
 
 
+def finalize_indexes():
+    """
+    Create OHLCV indexes once the historical data is loaded
+    Run by fill_database.py, or with --indexes after loading data another way
+    
+    Returns:
+        True if every index was built
+    """
+    
+    print("\n" + "=" * 70)
+    print("🗂️  CREATING OHLCV INDEXES")
+    print("=" * 70)
+    
+    conn = None
+    try:
+        conn = psycopg2.connect(DB_URL)
+        cursor = conn.cursor()
+        
+        for symbol in SYMBOLS:
+            for timeframe in TIMEFRAMES:
+                create_ohlcv_indexes(cursor, symbol, timeframe)
+            print(f"✅ Indexed: {symbol}")
+        
+        conn.commit()
+        cursor.close()
+        
+        return True
+        
+    except Exception as e:
+        print(f"\n❌ Error creating indexes: {e}")
+        return False
+    
+    finally:
+        if conn is not None:
+            conn.close()
+
+
 def verify_tables():
     """Verify all tables were created"""
     
@@ -205,10 +354,24 @@ def verify_tables():
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Create the scanner's database schema")
+    parser.add_argument('--indexes', action='store_true',
+                        help='only build the OHLCV indexes (after loading data without fill_database.py)')
+    args = parser.parse_args()
+    
+    if args.indexes:
+        if not finalize_indexes():
+            sys.exit(1)
+        print("\n✨ Done! OHLCV indexes are built")
+        sys.exit(0)
+    
     print("🚀 Starting database schema creation...\n")
     
     if create_all_tables():
         verify_tables()
         print("\n✨ Done! Your database is ready!")
+        print("Indexes are built after the initial load - fill_database.py runs finalize_indexes(),")
+        print("or run this script with --indexes after loading data another way")
     else:
-        print("\n❌ Schema creation failed. Check the errors above.")
\ No newline at end of file
+        print("\n❌ Schema creation failed. Check the errors above.")
+        sys.exit(1)
\ No newline at end of file
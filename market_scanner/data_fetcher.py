@@ -4,49 +4,77 @@ Fetches OHLCV data from Binance and calculates indicators
 """
 
 import ccxt
+import numpy as np
 import pandas as pd
-import pandas_ta as ta
 from datetime import datetime, timezone
-from typing import Optional, List, Dict
-import time
+from typing import Optional, List, Dict, Union
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import threading
+import asyncio
+import json
 import logging
 import os
+import time
+from config import SYMBOLS_CCXT, setup_logger
+
+# Setup logging
+logger = setup_logger(__name__, 'data_fetcher.log')
 
-# Setup logging to both file and console
-os.makedirs('logs', exist_ok=True)
-logger = logging.getLogger(__name__)
-logger.setLevel(logging.INFO)
+# Binance market metadata cached on disk between runs
+MARKETS_CACHE_PATH = os.path.expanduser('~/.cache/market_scanner/markets.json')
+MARKETS_CACHE_TTL = 24 * 60 * 60  # seconds
 
-# File handler
-fh = logging.FileHandler('logs/data_fetcher.log')
-fh.setLevel(logging.INFO)
 
-# Console handler
-ch = logging.StreamHandler()
-ch.setLevel(logging.INFO)
+def ema(closes: pd.DataFrame, length: int) -> pd.DataFrame:
+    """
+    EMA of every column at once, seeded with the SMA of the first `length` values
+    Same definition as pandas_ta.ema
+    """
+    seeded = closes.copy()
+    seeded.iloc[:length - 1] = np.nan
+    seeded.iloc[length - 1] = closes.iloc[:length].mean()
+    return seeded.ewm(span=length, adjust=False).mean()
 
-# Formatter
-formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
-fh.setFormatter(formatter)
-ch.setFormatter(formatter)
 
-# Add handlers
-logger.addHandler(fh)
-logger.addHandler(ch)
+def rsi(closes: pd.DataFrame, length: int) -> pd.DataFrame:
+    """
+    RSI of every column at once with Wilder smoothing
+    Same definition as pandas_ta.rsi
+    """
+    change = closes.diff()
+    avg_gain = change.clip(lower=0).ewm(alpha=1 / length, min_periods=length).mean()
+    avg_loss = (-change.clip(upper=0)).ewm(alpha=1 / length, min_periods=length).mean()
+    return 100 * avg_gain / (avg_gain + avg_loss)
 
 
 class DataFetcher:
     """Handles fetching OHLCV data from Binance and calculating indicators"""
     
     # Symbols to track
-    SYMBOLS = [
-        'BTC/USDT', 'ETH/USDT', 'LTC/USDT', 'XRP/USDT',
-        'DOGE/USDT', 'LINK/USDT', 'ADA/USDT'
-    ]
+    SYMBOLS = SYMBOLS_CCXT
     
     # Timeframes to monitor
     TIMEFRAMES = ['5m', '1h', '4h', '1d', '1w']  # Note: excluding 1M for now
     
+    # Parallel backfill worker threads. Each worker's ccxt client throttles only
+    # itself, so together they can send up to BACKFILL_WORKERS times one client's
+    # rate. A full backfill is at most len(SYMBOLS) x len(TIMEFRAMES) = 35 kline
+    # requests (fill_database.py: 21), far below Binance's 6000 weight/minute per IP; a 429 is retried
+    # with backoff (FETCH_ATTEMPTS)
+    BACKFILL_WORKERS = 8
+    
+    # In-flight requests for the asyncio fetch path (cron scripts)
+    ASYNC_FETCH_CONCURRENCY = 5
+    
+    # Transient exchange errors (429, timeouts, maintenance): attempts per request,
+    # and the cap on the exponential backoff between them, in seconds
+    FETCH_ATTEMPTS = 5
+    FETCH_BACKOFF_MAX = 30
+    
+    # Market metadata shared by every fetcher in the process
+    _markets = None
+    _markets_lock = threading.Lock()
+    
     def __init__(self):
         """Initialize Binance exchange connection"""
         self.exchange = ccxt.binance({
@@ -55,8 +83,81 @@ class DataFetcher:
                 'defaultType': 'spot'
             }
         })
+        self._worker = threading.local()
+        self._markets_ready = False
         logger.info("Initialized Binance connection")
     
+    def _ensure_markets(self):
+        """
+        Give the exchange client its market metadata without a load_markets() round trip
+        Order: in-process copy, then the on-disk cache (24h TTL), then Binance
+        """
+        if self._markets_ready:
+            return
+        
+        with DataFetcher._markets_lock:
+            if DataFetcher._markets is None:
+                DataFetcher._markets = self._read_markets_cache()
+            
+            if DataFetcher._markets is None:
+                self.exchange.load_markets()
+                DataFetcher._markets = {
+                    'markets': list(self.exchange.markets.values()),
+                    'currencies': self.exchange.currencies
+                }
+                self._write_markets_cache(DataFetcher._markets)
+            else:
+                self.exchange.set_markets(DataFetcher._markets['markets'], DataFetcher._markets['currencies'])
+        
+        self._markets_ready = True
+    
+    def _read_markets_cache(self) -> Optional[dict]:
+        """Read cached market metadata if it is younger than the TTL"""
+        try:
+            if time.time() - os.path.getmtime(MARKETS_CACHE_PATH) > MARKETS_CACHE_TTL:
+                return None
+            with open(MARKETS_CACHE_PATH) as f:
+                cached = json.load(f)
+            logger.info("Loaded Binance markets from cache")
+            return cached
+        except (OSError, ValueError):
+            return None
+    
+    def _write_markets_cache(self, markets: dict):
+        """Persist market metadata; a failed write only costs a reload next run"""
+        try:
+            os.makedirs(os.path.dirname(MARKETS_CACHE_PATH), exist_ok=True)
+            tmp_path = f"{MARKETS_CACHE_PATH}.{os.getpid()}.tmp"
+            with open(tmp_path, 'w') as f:
+                json.dump(markets, f)
+            os.replace(tmp_path, MARKETS_CACHE_PATH)
+        except (OSError, TypeError, ValueError) as e:
+            logger.warning("Could not write markets cache: %s", e)
+    
+    def _retry_delay(self, attempt: int, error: Exception) -> float:
+        """Seconds to wait before retry number `attempt` (1-based): Retry-After if given, else 1, 2, 4, ..."""
+        retry_after = getattr(error, 'retry_after', None)
+        if retry_after:
+            return min(float(retry_after), self.FETCH_BACKOFF_MAX)
+        return min(2 ** (attempt - 1), self.FETCH_BACKOFF_MAX)
+    
+    def _fetch_ohlcv_with_retry(self, symbol: str, timeframe: str, limit: int, since: Optional[int]) -> list:
+        """exchange.fetch_ohlcv, retried with backoff on ccxt.NetworkError (includes RateLimitExceeded)"""
+        for attempt in range(1, self.FETCH_ATTEMPTS + 1):
+            try:
+                return self.exchange.fetch_ohlcv(
+                    symbol=symbol,
+                    timeframe=timeframe,
+                    limit=limit,
+                    since=since
+                )
+            except ccxt.NetworkError as e:
+                if attempt == self.FETCH_ATTEMPTS:
+                    raise
+                delay = self._retry_delay(attempt, e)
+                logger.warning("Fetch %s %s failed (%s), retry %d in %.0fs", symbol, timeframe, e, attempt, delay)
+                time.sleep(delay)
+    
     def fetch_ohlcv(
         self, 
         symbol: str, 
@@ -77,15 +178,11 @@ class DataFetcher:
             DataFrame with columns: timestamp, open, high, low, close, volume
         """
         try:
-            logger.info(f"Fetching {limit} {timeframe} candles for {symbol}")
+            logger.info("Fetching %d %s candles for %s", limit, timeframe, symbol)
+            self._ensure_markets()
             
             # Fetch from exchange
-            ohlcv = self.exchange.fetch_ohlcv(
-                symbol=symbol,
-                timeframe=timeframe,
-                limit=limit,
-                since=since
-            )
+            ohlcv = self._fetch_ohlcv_with_retry(symbol, timeframe, limit, since)
             
             # Convert to DataFrame
             df = pd.DataFrame(
@@ -96,13 +193,90 @@ class DataFetcher:
             # Convert timestamp from milliseconds to datetime
             df['timestamp'] = pd.to_datetime(df['timestamp'], unit='ms', utc=True)
             
-            logger.info(f"Fetched {len(df)} candles for {symbol} {timeframe}")
+            logger.info("Fetched %d candles for %s %s", len(df), symbol, timeframe)
             return df
             
         except Exception as e:
-            logger.error(f"Error fetching {symbol} {timeframe}: {e}")
+            logger.error("Error fetching %s %s: %s", symbol, timeframe, e)
             raise
     
+    def fetch_ohlcv_raw(
+        self,
+        symbol: str,
+        timeframe: str,
+        limit: int = 1000,
+        since: Optional[int] = None
+    ) -> List[tuple]:
+        """
+        Fetch OHLCV data from Binance as plain tuples (no DataFrame)
+        
+        Args:
+            symbol: Trading pair (e.g., 'BTC/USDT')
+            timeframe: Candle timeframe ('5m', '1h', '4h', '1d', '1w')
+            limit: Number of candles to fetch (max 1000)
+            since: Timestamp in milliseconds to fetch from (optional)
+        
+        Returns:
+            List of tuples: (timestamp, open, high, low, close, volume)
+        """
+        try:
+            logger.info("Fetching %d %s candles for %s", limit, timeframe, symbol)
+            self._ensure_markets()
+            
+            ohlcv = self._fetch_ohlcv_with_retry(symbol, timeframe, limit, since)
+            
+            rows = [
+                (datetime.fromtimestamp(ms / 1000, tz=timezone.utc), float(o), float(h), float(l), float(c), float(v))
+                for ms, o, h, l, c, v in ohlcv
+            ]
+            
+            logger.info("Fetched %d candles for %s %s", len(rows), symbol, timeframe)
+            return rows
+            
+        except Exception as e:
+            logger.error("Error fetching %s %s: %s", symbol, timeframe, e)
+            raise
+    
+    def fetch_records_with_indicators(
+        self,
+        symbol: str,
+        timeframe: str,
+        limit: int = 1000,
+        since: Optional[int] = None
+    ) -> List[tuple]:
+        """
+        Fetch OHLCV data and return insert-ready records with indicators
+        Bulk ingest path: indicators come from one NumPy close array, no DataFrame rows
+        Excludes the last incomplete candle
+        
+        Args:
+            symbol: Trading pair (e.g., 'BTC/USDT')
+            timeframe: Candle timeframe
+            limit: Number of candles
+            since: Timestamp to fetch from
+        
+        Returns:
+            List of tuples: (timestamp, open, high, low, close, volume, rsi_8, ema_20, ema_50)
+        """
+        rows = self.fetch_ohlcv_raw(symbol, timeframe, limit, since)
+        
+        # Need at least 50 candles for EMA(50)
+        if len(rows) < 50:
+            logger.warning("Not enough data for indicators (need 50, got %d)", len(rows))
+            return [row + (None, None, None) for row in rows[:-1]]
+        
+        closes = pd.DataFrame(np.array([row[4] for row in rows], dtype=np.float64))
+        numbers = np.column_stack([
+            rsi(closes, 8)[0].to_numpy(),
+            ema(closes, 20)[0].to_numpy(),
+            ema(closes, 50)[0].to_numpy()
+        ])
+        indicators = numbers.astype(object)
+        indicators[np.isnan(numbers)] = None
+        
+        # Remove last candle (still forming)
+        return [row + tuple(values) for row, values in zip(rows[:-1], indicators[:-1])]
+    
     def calculate_indicators(self, df: pd.DataFrame) -> pd.DataFrame:
         """
         Calculate RSI(8), EMA(20), and EMA(50) indicators
@@ -113,27 +287,59 @@ class DataFetcher:
         Returns:
             DataFrame with added indicator columns
         """
+        return self.calculate_indicators_batch([df])[0]
+    
+    def calculate_indicators_batch(self, dfs: List[pd.DataFrame]) -> List[pd.DataFrame]:
+        """
+        Calculate RSI(8), EMA(20), and EMA(50) for many DataFrames in one pass
+        Closes are stacked side by side so each indicator is one column-wise ewm call
+        
+        Args:
+            dfs: DataFrames with OHLCV data (lengths may differ)
+        
+        Returns:
+            The same DataFrames with added indicator columns
+        """
         try:
             # Need at least 50 candles for EMA(50)
-            if len(df) < 50:
-                logger.warning(f"Not enough data for indicators (need 50, got {len(df)})")
-                df['rsi_8'] = None
-                df['ema_20'] = None
-                df['ema_50'] = None
-                return df
+            ready = []
+            for df in dfs:
+                if len(df) < 50:
+                    logger.warning("Not enough data for indicators (need 50, got %d)", len(df))
+                    # NaN keeps the columns float64 (None would make them object)
+                    df['rsi_8'] = np.nan
+                    df['ema_20'] = np.nan
+                    df['ema_50'] = np.nan
+                else:
+                    ready.append(df)
+            
+            if not ready:
+                return dfs
             
-            # Calculate RSI(8) - matches TradingView indicator
-            df['rsi_8'] = ta.rsi(df['close'], length=8)
+            # One column per DataFrame, aligned by position (shorter ones padded at the end)
+            closes = pd.concat(
+                [pd.Series(df['close'].to_numpy(dtype=np.float64)) for df in ready],
+                axis=1,
+                ignore_index=True
+            )
+            
+            # RSI(8) - matches TradingView indicator
+            indicators = {
+                'rsi_8': rsi(closes, 8),
+                'ema_20': ema(closes, 20),
+                'ema_50': ema(closes, 50)
+            }
             
-            # Calculate EMAs
-            df['ema_20'] = ta.ema(df['close'], length=20)
-            df['ema_50'] = ta.ema(df['close'], length=50)
+            for i, df in enumerate(ready):
+                for column, values in indicators.items():
+                    df[column] = values[i].to_numpy()[:len(df)]
             
-            logger.debug(f"Calculated indicators for {len(df)} candles")
-            return df
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("Calculated indicators for %d series", len(ready))
+            return dfs
             
         except Exception as e:
-            logger.error(f"Error calculating indicators: {e}")
+            logger.error("Error calculating indicators: %s", e)
             raise
     
     def fetch_with_indicators(
@@ -161,36 +367,166 @@ class DataFetcher:
         
         # Remove last candle (still forming)
         df = df[:-1]
-        logger.info(f"Removed last incomplete candle, {len(df)} complete candles remaining")
+        logger.info("Removed last incomplete candle, %d complete candles remaining", len(df))
         
         return df
     
-    def backfill_historical_data(self) -> Dict[str, Dict[str, pd.DataFrame]]:
+    def fetch_many_with_indicators(
+        self,
+        symbols: List[str],
+        timeframe: str,
+        limit: int = 60
+    ) -> Dict[str, Union[pd.DataFrame, Exception]]:
+        """
+        Fetch several symbols concurrently and add indicators
+        Requests overlap on one asyncio ccxt client instead of running back to back
+        Excludes the last incomplete candle
+        
+        Args:
+            symbols: Trading pairs (e.g., ['BTC/USDT', 'ETH/USDT'])
+            timeframe: Candle timeframe
+            limit: Number of candles per symbol
+        
+        Returns:
+            dict of symbol -> DataFrame with OHLCV + indicators, or the exception
+            raised for that symbol
+        """
+        return asyncio.run(self.fetch_many_with_indicators_async(symbols, timeframe, limit))
+    
+    def create_async_exchange(self) -> 'ccxt.async_support.binance':
+        """
+        asyncio Binance client with the shared market metadata already loaded
+        Caller owns it and must `await exchange.close()`
+        """
+        self._ensure_markets()
+        
+        # Only the cron fast path is async; the backfill never loads this module
+        import ccxt.async_support
+        exchange = ccxt.async_support.binance({
+            'enableRateLimit': True,
+            'options': {
+                'defaultType': 'spot'
+            }
+        })
+        exchange.set_markets(DataFetcher._markets['markets'], DataFetcher._markets['currencies'])
+        return exchange
+    
+    async def fetch_many_with_indicators_async(
+        self,
+        symbols: List[str],
+        timeframe: str,
+        limit: int = 60,
+        exchange: Optional['ccxt.async_support.binance'] = None
+    ) -> Dict[str, Union[pd.DataFrame, Exception]]:
+        """
+        Coroutine behind fetch_many_with_indicators
+        Pass a client from create_async_exchange() to keep its connections
+        open across calls; otherwise a temporary one is created and closed
+        """
+        own_exchange = exchange is None
+        if own_exchange:
+            exchange = self.create_async_exchange()
+        slots = asyncio.Semaphore(self.ASYNC_FETCH_CONCURRENCY)
+        
+        async def fetch(symbol):
+            for attempt in range(1, self.FETCH_ATTEMPTS + 1):
+                async with slots:
+                    try:
+                        logger.info("Fetching %d %s candles for %s", limit, timeframe, symbol)
+                        return await exchange.fetch_ohlcv(symbol=symbol, timeframe=timeframe, limit=limit)
+                    except ccxt.NetworkError as e:
+                        if attempt == self.FETCH_ATTEMPTS:
+                            raise
+                        delay = self._retry_delay(attempt, e)
+                        logger.warning("Fetch %s %s failed (%s), retry %d in %.0fs", symbol, timeframe, e, attempt, delay)
+                
+                # Back off without holding a slot, so other symbols keep going
+                await asyncio.sleep(delay)
+        
+        try:
+            results = await asyncio.gather(*[fetch(symbol) for symbol in symbols], return_exceptions=True)
+        finally:
+            if own_exchange:
+                await exchange.close()
+        
+        data = {}
+        for symbol, ohlcv in zip(symbols, results):
+            if isinstance(ohlcv, Exception):
+                logger.error("Error fetching %s %s: %s", symbol, timeframe, ohlcv)
+                data[symbol] = ohlcv
+                continue
+            
+            df = pd.DataFrame(
+                ohlcv,
+                columns=['timestamp', 'open', 'high', 'low', 'close', 'volume']
+            )
+            df['timestamp'] = pd.to_datetime(df['timestamp'], unit='ms', utc=True)
+            data[symbol] = df
+        
+        frames = [df for df in data.values() if isinstance(df, pd.DataFrame)]
+        self.calculate_indicators_batch(frames)
+        
+        # Remove last candle (still forming)
+        return {
+            symbol: df[:-1] if isinstance(df, pd.DataFrame) else df
+            for symbol, df in data.items()
+        }
+    
+    def _fetch_in_worker(self, symbol: str, timeframe: str, limit: int) -> pd.DataFrame:
+        """
+        Fetch candles on the calling thread's own fetcher
+        ccxt clients are not shared between threads; each keeps its own rate limiter
+        """
+        fetcher = getattr(self._worker, 'fetcher', None)
+        if fetcher is None:
+            fetcher = DataFetcher()
+            self._worker.fetcher = fetcher
+        
+        return fetcher.fetch_ohlcv(symbol, timeframe, limit=limit)
+    
+    def backfill_historical_data(
+        self,
+        symbols: Optional[List[str]] = None,
+        timeframes: Optional[List[str]] = None,
+        limit: int = 1000
+    ) -> Dict[str, Dict[str, pd.DataFrame]]:
         """
         Fetch historical data for all symbols and timeframes
-        Initial data load for the system
+        Initial data load for the system, fetched concurrently
+        
+        Args:
+            symbols: Trading pairs (default: SYMBOLS)
+            timeframes: Candle timeframes (default: TIMEFRAMES)
+            limit: Number of candles per pair (max 1000)
         
         Returns:
-            Nested dict: {symbol: {timeframe: DataFrame}}
+            Nested dict: {symbol: {timeframe: DataFrame}}, None where the fetch failed
         """
+        symbols = symbols or self.SYMBOLS
+        timeframes = timeframes or self.TIMEFRAMES
+        
         logger.info("Starting historical data backfill")
-        data = {}
+        data = {symbol: {timeframe: None for timeframe in timeframes} for symbol in symbols}
+        fetched = []
         
-        for symbol in self.SYMBOLS:
-            data[symbol] = {}
+        with ThreadPoolExecutor(max_workers=self.BACKFILL_WORKERS) as executor:
+            futures = {
+                executor.submit(self._fetch_in_worker, symbol, timeframe, limit): (symbol, timeframe)
+                for symbol in symbols
+                for timeframe in timeframes
+            }
             
-            for timeframe in self.TIMEFRAMES:
+            for future in as_completed(futures):
+                symbol, timeframe = futures[future]
                 try:
-                    # Fetch 1000 candles with indicators
-                    df = self.fetch_with_indicators(symbol, timeframe, limit=1000)
-                    data[symbol][timeframe] = df
-                    
-                    # Small delay to respect rate limits
-                    time.sleep(0.1)
-                    
+                    fetched.append((symbol, timeframe, future.result()))
                 except Exception as e:
-                    logger.error(f"Failed to backfill {symbol} {timeframe}: {e}")
-                    data[symbol][timeframe] = None
+                    logger.error("Failed to backfill %s %s: %s", symbol, timeframe, e)
+        
+        # Indicators for every series in one batch, then drop the still-forming candle
+        dfs = self.calculate_indicators_batch([df for _, _, df in fetched])
+        for (symbol, timeframe, _), df in zip(fetched, dfs):
+            data[symbol][timeframe] = df[:-1]
         
         logger.info("Historical data backfill complete")
         return data
@@ -212,22 +548,18 @@ class DataFetcher:
         Returns:
             List of tuples: (timestamp, open, high, low, close, volume, rsi_8, ema_20, ema_50)
         """
-        records = []
-        
-        for _, row in df.iterrows():
-            records.append((
-                row['timestamp'],
-                float(row['open']),
-                float(row['high']),
-                float(row['low']),
-                float(row['close']),
-                float(row['volume']),
-                float(row['rsi_8']) if pd.notna(row['rsi_8']) else None,
-                float(row['ema_20']) if pd.notna(row['ema_20']) else None,
-                float(row['ema_50']) if pd.notna(row['ema_50']) else None
-            ))
-        
-        return records
+        numeric_columns = ['open', 'high', 'low', 'close', 'volume', 'rsi_8', 'ema_20', 'ema_50']
+        
+        # Convert whole columns at once: float64 first, then box to Python objects
+        numbers = df[numeric_columns].to_numpy(dtype=np.float64)
+        values = np.empty((len(df), len(numeric_columns) + 1), dtype=object)
+        values[:, 0] = df['timestamp'].to_numpy(dtype=object)
+        values[:, 1:] = numbers
+        
+        # Missing indicator values become NULL (one NaN check on the float block)
+        values[:, 1:][np.isnan(numbers)] = None
+        
+        return list(map(tuple, values))
 
 
 def test_btc_weekly():
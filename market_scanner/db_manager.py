@@ -3,37 +3,87 @@ Database manager for crypto scanner
 Handles PostgreSQL operations
 """
 
-import psycopg2
-from psycopg2.extras import execute_batch
-from typing import List, Tuple
-import logging
-import os
-from dotenv import load_dotenv
+from psycopg2.extras import execute_batch, execute_values
+from contextlib import contextmanager
+from typing import Dict, List, Tuple
+from datetime import datetime, timedelta, timezone
+import io
+import struct
+from config import DB_URL, setup_logger
+from db_pool import get_pool, pool_cursor, prepare
 
-# Load environment variables from .env file
-load_dotenv()
+# Setup logging
+logger = setup_logger(__name__, 'db_manager.log')
 
-# Setup logging to both file and console
-os.makedirs('logs', exist_ok=True)
-logger = logging.getLogger(__name__)
-logger.setLevel(logging.INFO)
 
-# File handler
-fh = logging.FileHandler('logs/db_manager.log')
-fh.setLevel(logging.INFO)
+# PostgreSQL binary COPY framing (see "COPY ... FORMAT BINARY" in the docs)
+PG_COPY_HEADER = b'PGCOPY\n\xff\r\n\x00' + struct.pack('!ii', 0, 0)
+PG_COPY_TRAILER = struct.pack('!h', -1)
+PG_EPOCH = datetime(2000, 1, 1, tzinfo=timezone.utc)
 
-# Console handler
-ch = logging.StreamHandler()
-ch.setLevel(logging.INFO)
 
-# Formatter
-formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
-fh.setFormatter(formatter)
-ch.setFormatter(formatter)
+def ohlcv_copy_buffer(records: List[Tuple]) -> io.BytesIO:
+    """
+    Encode OHLCV records as a PostgreSQL binary COPY stream
+    
+    Args:
+        records: List of tuples (timestamp, open, high, low, close, volume, rsi_8, ema_20, ema_50)
+    
+    Returns:
+        Buffer ready for COPY ... FROM STDIN WITH (FORMAT BINARY)
+    """
+    row_header = struct.pack('!h', 9)
+    timestamp_field = struct.Struct('!iq')  # length 8, microseconds since 2000-01-01 UTC
+    float_field = struct.Struct('!id')      # length 8, IEEE 754 double
+    null_field = struct.pack('!i', -1)
+    one_microsecond = timedelta(microseconds=1)
+    
+    buf = io.BytesIO()
+    buf.write(PG_COPY_HEADER)
+    
+    for record in records:
+        buf.write(row_header)
+        buf.write(timestamp_field.pack(8, (record[0] - PG_EPOCH) // one_microsecond))
+        for value in record[1:]:
+            buf.write(null_field if value is None else float_field.pack(8, value))
+    
+    buf.write(PG_COPY_TRAILER)
+    buf.seek(0)
+    return buf
 
-# Add handlers
-logger.addHandler(fh)
-logger.addHandler(ch)
+
+def levels_copy_buffer(symbol: str, timeframe: str, records: List[Tuple]) -> io.BytesIO:
+    """
+    Encode levels as a PostgreSQL binary COPY stream
+    
+    Args:
+        symbol: e.g., 'btcusdt'
+        timeframe: 'daily', 'weekly', 'monthly'
+        records: List of tuples (level, timestamp)
+    
+    Returns:
+        Buffer for COPY ... (symbol, timeframe, level, timestamp) FROM STDIN WITH (FORMAT BINARY)
+    """
+    symbol_bytes = symbol.encode()
+    timeframe_bytes = timeframe.encode()
+    
+    # Row header plus the two text fields, identical for every row
+    row_prefix = (struct.pack('!h', 4)
+                  + struct.pack('!i', len(symbol_bytes)) + symbol_bytes
+                  + struct.pack('!i', len(timeframe_bytes)) + timeframe_bytes)
+    level_timestamp_fields = struct.Struct('!idiq')  # float8 level, timestamptz in microseconds
+    one_microsecond = timedelta(microseconds=1)
+    
+    buf = io.BytesIO()
+    buf.write(PG_COPY_HEADER)
+    
+    for level, timestamp in records:
+        buf.write(row_prefix)
+        buf.write(level_timestamp_fields.pack(8, level, 8, (timestamp - PG_EPOCH) // one_microsecond))
+    
+    buf.write(PG_COPY_TRAILER)
+    buf.seek(0)
+    return buf
 
 
 class DBManager:
@@ -46,30 +96,61 @@ class DBManager:
         Args:
             db_url: PostgreSQL connection string (or use DB_URL env var)
         """
-        self.db_url = db_url or os.getenv('DB_URL')
+        self.db_url = db_url or DB_URL
         if not self.db_url:
             raise ValueError("DB_URL not provided and not found in environment")
         
-        self.conn = None
+        self.pool = None
         self.connect()
     
     def connect(self):
-        """Establish database connection"""
+        """Attach to the process-wide connection pool (created on first use)"""
         try:
-            self.conn = psycopg2.connect(self.db_url)
-            self.conn.autocommit = False  # Use transactions
+            self.pool = get_pool(self.db_url)
             logger.info("Connected to PostgreSQL")
         except Exception as e:
-            logger.error(f"Failed to connect to database: {e}")
+            logger.error("Failed to connect to database: %s", e)
             raise
     
     def close(self):
-        """Close database connection"""
-        if self.conn:
-            self.conn.close()
-            logger.info("Database connection closed")
+        """Release this manager; pooled connections are reused and closed at exit"""
+        self.pool = None
+        logger.info("Database connection closed")
     
-    def insert_ohlcv(self, symbol: str, timeframe: str, records: List[Tuple]):
+    @contextmanager
+    def transaction(self, bulk: bool = False):
+        """
+        Run several operations in one transaction on one cursor
+        Pass the yielded cursor to insert/count methods via cursor=...
+        
+        Args:
+            bulk: Skip waiting for the WAL flush on commit (backfills)
+        
+        Yields:
+            Cursor that is committed on success, rolled back on error
+        """
+        with pool_cursor(self.db_url) as cursor:
+            if bulk:
+                cursor.execute("SET LOCAL synchronous_commit = off")
+            yield cursor
+    
+    @contextmanager
+    def _cursor(self, cursor=None, bulk: bool = False):
+        """
+        Reuse the caller's transaction cursor, or open a one-off transaction
+        (bulk is passed to transaction() and only applies to the one-off case)
+        """
+        if cursor is not None:
+            yield cursor
+            return
+        with self.transaction(bulk=bulk) as cursor:
+            yield cursor
+    
+    def _prepare(self, cursor, name: str, statement: str):
+        """PREPARE a statement once per pooled connection (see db_pool.prepare)"""
+        prepare(cursor, name, statement)
+    
+    def insert_ohlcv(self, symbol: str, timeframe: str, records: List[Tuple], cursor=None):
         """
         Insert OHLCV data with indicators into symbol_timeframe table
         Uses ON CONFLICT DO NOTHING to avoid duplicates
@@ -78,31 +159,141 @@ class DBManager:
             symbol: e.g., 'btcusdt'
             timeframe: e.g., '1w', '1d', '1h'
             records: List of tuples (timestamp, open, high, low, close, volume, rsi_8, ema_20, ema_50)
+            cursor: Cursor from transaction() to join, or None for its own transaction
         """
         table_name = f"{symbol}_{timeframe}"
         
         try:
-            cursor = self.conn.cursor()
+            with self._cursor(cursor) as cursor:
+                # Single multi-row INSERT per page instead of one statement per row
+                query = f"""
+                    INSERT INTO "{table_name}" 
+                    (timestamp, open, high, low, close, volume, rsi_8, ema_20, ema_50)
+                    VALUES %s
+                    ON CONFLICT (timestamp) DO NOTHING
+                """
+                
+                execute_values(cursor, query, records, page_size=1000)
             
-            query = f"""
-                INSERT INTO "{table_name}" 
-                (timestamp, open, high, low, close, volume, rsi_8, ema_20, ema_50)
-                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
-                ON CONFLICT (timestamp) DO NOTHING
-            """
+            logger.info("Inserted %d candles into %s", len(records), table_name)
             
-            execute_batch(cursor, query, records, page_size=100)
-            self.conn.commit()
+        except Exception as e:
+            logger.error("Error inserting into %s: %s", table_name, e)
+            raise
+    
+    def insert_ohlcv_batch(self, timeframe: str, records_by_symbol: Dict[str, List[Tuple]], cursor=None):
+        """
+        Insert OHLCV records for several symbols in one transaction
+        One multi-row INSERT per symbol_timeframe table, one commit for all of them
+        
+        Args:
+            timeframe: e.g., '5m', '1h'
+            records_by_symbol: dict of symbol (e.g., 'btcusdt') -> list of record tuples
+            cursor: Cursor from transaction() to join, or None for its own transaction
+        """
+        try:
+            with self._cursor(cursor) as cursor:
+                for symbol, records in records_by_symbol.items():
+                    self.insert_ohlcv(symbol, timeframe, records, cursor=cursor)
+            
+            logger.info("Inserted %s candles for %d symbols in one transaction", timeframe, len(records_by_symbol))
+            
+        except Exception as e:
+            logger.error("Error inserting %s batch: %s", timeframe, e)
+            raise
+    
+    def insert_ohlcv_copy(self, symbol: str, timeframe: str, records: List[Tuple], cursor=None):
+        """
+        Bulk insert OHLCV data using COPY into a staging table
+        Rows are then moved into symbol_timeframe with ON CONFLICT DO NOTHING,
+        so this is safe to run against tables that already hold data
+        
+        Args:
+            symbol: e.g., 'btcusdt'
+            timeframe: e.g., '1w', '1d', '1h'
+            records: List of tuples (timestamp, open, high, low, close, volume, rsi_8, ema_20, ema_50)
+            cursor: Cursor from transaction() to join, or None for its own transaction
+        """
+        table_name = f"{symbol}_{timeframe}"
+        staging_name = f"{table_name}_staging"
+        columns = "timestamp, open, high, low, close, volume, rsi_8, ema_20, ema_50"
+        
+        buf = ohlcv_copy_buffer(records)
+        
+        try:
+            with self._cursor(cursor) as cursor:
+                # Temp tables are never WAL-logged and vanish at commit; drop any
+                # staging table left by an earlier call in the same transaction
+                # (pg_temp-qualified so it can never resolve to a permanent table)
+                cursor.execute(f'DROP TABLE IF EXISTS pg_temp."{staging_name}"')
+                cursor.execute(f"""
+                    CREATE TEMP TABLE "{staging_name}" ON COMMIT DROP AS
+                    SELECT {columns} FROM "{table_name}" WITH NO DATA
+                """)
+                cursor.copy_expert(
+                    f'COPY "{staging_name}" ({columns}) FROM STDIN WITH (FORMAT BINARY)',
+                    buf
+                )
+                cursor.execute(f"""
+                    INSERT INTO "{table_name}" ({columns})
+                    SELECT {columns} FROM "{staging_name}"
+                    ON CONFLICT (timestamp) DO NOTHING
+                """)
+                inserted = cursor.rowcount
             
-            logger.info(f"Inserted {len(records)} candles into {table_name}")
-            cursor.close()
+            logger.info("Copied %d candles into %s (%d new)", len(records), table_name, inserted)
             
         except Exception as e:
-            self.conn.rollback()
-            logger.error(f"Error inserting into {table_name}: {e}")
+            logger.error("Error copying into %s: %s", table_name, e)
             raise
     
-    def insert_levels(self, symbol: str, timeframe: str, records: List[Tuple], level_type: str):
+    def copy_ohlcv(self, symbol: str, timeframe: str, records: List[Tuple], cursor=None):
+        """
+        Load OHLCV data straight into an empty symbol_timeframe table with binary COPY
+        No conflict handling - use insert_ohlcv_copy for tables that already hold data
+        
+        Args:
+            symbol: e.g., 'btcusdt'
+            timeframe: e.g., '1w', '1d', '1h'
+            records: List of tuples (timestamp, open, high, low, close, volume, rsi_8, ema_20, ema_50)
+            cursor: Cursor from transaction() to join, or None for its own transaction
+        """
+        table_name = f"{symbol}_{timeframe}"
+        buf = ohlcv_copy_buffer(records)
+        
+        try:
+            # Bulk load: don't wait for the WAL flush on commit
+            with self._cursor(cursor, bulk=True) as cursor:
+                cursor.copy_expert(
+                    f'''COPY "{table_name}" (timestamp, open, high, low, close, volume, rsi_8, ema_20, ema_50)
+                    FROM STDIN WITH (FORMAT BINARY)''',
+                    buf
+                )
+            
+            logger.info("Copied %d candles into %s", len(records), table_name)
+            
+        except Exception as e:
+            logger.error("Error copying into %s: %s", table_name, e)
+            raise
+    
+    def _execute_level_inserts(self, cursor, level_type: str, full_records: List[Tuple]):
+        """Insert (symbol, timeframe, level, timestamp) rows into high_levels or low_levels"""
+        table_name = f"{level_type}_levels"
+        
+        # Same statement text for every symbol/timeframe, so plan it once
+        statement_name = f"insert_{table_name}"
+        self._prepare(cursor, statement_name, f"""
+            (text, text, double precision, timestamptz) AS
+            INSERT INTO {table_name}
+            (symbol, timeframe, level, timestamp)
+            VALUES ($1, $2, $3, $4)
+        """)
+        
+        # 1000 statements per round trip: past that, gains flatten out,
+        # while 100 paid ten times the network/driver overhead.
+        execute_batch(cursor, f"EXECUTE {statement_name} (%s, %s, %s, %s)", full_records, page_size=1000)
+    
+    def insert_levels(self, symbol: str, timeframe: str, records: List[Tuple], level_type: str, cursor=None):
         """
         Insert high or low levels into high_levels or low_levels table
         
@@ -111,39 +302,83 @@ class DBManager:
             timeframe: 'daily', 'weekly', 'monthly'
             records: List of tuples (level, timestamp)
             level_type: 'high' or 'low'
+            cursor: Cursor from transaction() to join, or None for its own transaction
+        """
+        try:
+            with self._cursor(cursor) as cursor:
+                # Add symbol and timeframe to each record
+                full_records = [(symbol, timeframe, level, timestamp) for level, timestamp in records]
+                self._execute_level_inserts(cursor, level_type, full_records)
+            
+            logger.info("Inserted %d %s levels for %s %s", len(records), level_type, symbol, timeframe)
+            
+        except Exception as e:
+            logger.error("Error inserting %s levels: %s", level_type, e)
+            raise
+    
+    def copy_levels(self, symbol: str, timeframe: str, records: List[Tuple], level_type: str, cursor=None):
+        """
+        Bulk load high or low levels with binary COPY
+        Levels have no unique key, so this is safe on tables that already hold data
+        
+        Args:
+            symbol: e.g., 'btcusdt'
+            timeframe: 'daily', 'weekly', 'monthly'
+            records: List of tuples (level, timestamp)
+            level_type: 'high' or 'low'
+            cursor: Cursor from transaction() to join, or None for its own transaction
         """
         table_name = f"{level_type}_levels"
+        buf = levels_copy_buffer(symbol, timeframe, records)
         
         try:
-            cursor = self.conn.cursor()
-            
-            query = f"""
-                INSERT INTO {table_name}
-                (symbol, timeframe, level, timestamp)
-                VALUES (%s, %s, %s, %s)
-            """
+            with self._cursor(cursor) as cursor:
+                cursor.copy_expert(
+                    f"COPY {table_name} (symbol, timeframe, level, timestamp) FROM STDIN WITH (FORMAT BINARY)",
+                    buf
+                )
             
-            # Add symbol and timeframe to each record
-            full_records = [(symbol, timeframe, level, timestamp) for level, timestamp in records]
+            logger.info("Copied %d %s levels for %s %s", len(records), level_type, symbol, timeframe)
             
-            execute_batch(cursor, query, full_records, page_size=100)
-            self.conn.commit()
+        except Exception as e:
+            logger.error("Error copying %s levels: %s", level_type, e)
+            raise
+    
+    def insert_levels_batch(self, timeframe: str, records_by_symbol: Dict[str, List[Tuple]], 
+                            level_type: str, cursor=None):
+        """
+        Insert high or low levels for several symbols in one round trip
+        
+        Args:
+            timeframe: 'daily', 'weekly', 'monthly'
+            records_by_symbol: dict of symbol (e.g., 'btcusdt') -> list of (level, timestamp)
+            level_type: 'high' or 'low'
+            cursor: Cursor from transaction() to join, or None for its own transaction
+        """
+        try:
+            with self._cursor(cursor) as cursor:
+                full_records = [
+                    (symbol, timeframe, level, timestamp)
+                    for symbol, records in records_by_symbol.items()
+                    for level, timestamp in records
+                ]
+                self._execute_level_inserts(cursor, level_type, full_records)
             
-            logger.info(f"Inserted {len(records)} {level_type} levels for {symbol} {timeframe}")
-            cursor.close()
+            logger.info("Inserted %d %s levels for %d symbols %s", len(full_records), level_type, 
+                        len(records_by_symbol), timeframe)
             
         except Exception as e:
-            self.conn.rollback()
-            logger.error(f"Error inserting {level_type} levels: {e}")
+            logger.error("Error inserting %s level batch: %s", level_type, e)
             raise
     
-    def get_candle_count(self, symbol: str, timeframe: str) -> int:
+    def get_candle_count(self, symbol: str, timeframe: str, cursor=None) -> int:
         """
         Get number of candles in a table
         
         Args:
             symbol: e.g., 'btcusdt'
             timeframe: e.g., '1w'
+            cursor: Cursor from transaction() to join, or None for its own transaction
         
         Returns:
             Count of candles
@@ -151,16 +386,68 @@ class DBManager:
         table_name = f"{symbol}_{timeframe}"
         
         try:
-            cursor = self.conn.cursor()
-            cursor.execute(f'''SELECT COUNT(*) FROM "{table_name}"''')
-            count = cursor.fetchone()[0]
-            cursor.close()
-            return count
+            with self._cursor(cursor) as cursor:
+                cursor.execute(f'''SELECT COUNT(*) FROM "{table_name}"''')
+                count = cursor.fetchone()[0]
+                return count
+        except Exception as e:
+            logger.error("Error counting candles in %s: %s", table_name, e)
+            raise
+    
+    def get_candle_counts(self, symbols: List[str], timeframes: List[str], cursor=None) -> Dict[Tuple[str, str], int]:
+        """
+        Get the number of candles in several tables with one query
+        
+        Args:
+            symbols: e.g., ['btcusdt', 'ethusdt']
+            timeframes: e.g., ['1d', '1w']
+            cursor: Cursor from transaction() to join, or None for its own transaction
+        
+        Returns:
+            dict of (symbol, timeframe) -> count of candles
+        """
+        pairs = [(symbol, timeframe) for symbol in symbols for timeframe in timeframes]
+        
+        # One UNION ALL round trip instead of one COUNT per table
+        query = " UNION ALL ".join(
+            f'''SELECT %s, %s, COUNT(*) FROM "{symbol}_{timeframe}"''' for symbol, timeframe in pairs
+        )
+        params = [value for pair in pairs for value in pair]
+        
+        try:
+            with self._cursor(cursor) as cursor:
+                cursor.execute(query, params)
+                return {(symbol, timeframe): count for symbol, timeframe, count in cursor.fetchall()}
+        except Exception as e:
+            logger.error("Error counting candles in %d tables: %s", len(pairs), e)
+            raise
+    
+    def get_latest_timestamps(self, symbols: List[str], timeframe: str, cursor=None) -> Dict[str, datetime]:
+        """
+        Get the newest stored candle timestamp of several tables with one query
+        
+        Args:
+            symbols: e.g., ['btcusdt', 'ethusdt']
+            timeframe: e.g., '1d'
+            cursor: Cursor from transaction() to join, or None for its own transaction
+        
+        Returns:
+            dict of symbol -> latest timestamp (symbols with empty tables are left out)
+        """
+        # MAX(timestamp) is answered from the end of the primary key index
+        query = " UNION ALL ".join(
+            f'''SELECT %s, MAX(timestamp) FROM "{symbol}_{timeframe}"''' for symbol in symbols
+        )
+        
+        try:
+            with self._cursor(cursor) as cursor:
+                cursor.execute(query, list(symbols))
+                return {symbol: latest for symbol, latest in cursor.fetchall() if latest is not None}
         except Exception as e:
-            logger.error(f"Error counting candles in {table_name}: {e}")
+            logger.error("Error reading latest %s timestamps: %s", timeframe, e)
             raise
     
-    def get_level_count(self, symbol: str, timeframe: str, level_type: str) -> int:
+    def get_level_count(self, symbol: str, timeframe: str, level_type: str, cursor=None) -> int:
         """
         Get number of levels for a symbol/timeframe
         
@@ -168,6 +455,7 @@ class DBManager:
             symbol: e.g., 'btcusdt'
             timeframe: 'daily', 'weekly', 'monthly'
             level_type: 'high' or 'low'
+            cursor: Cursor from transaction() to join, or None for its own transaction
         
         Returns:
             Count of levels
@@ -175,16 +463,15 @@ class DBManager:
         table_name = f"{level_type}_levels"
         
         try:
-            cursor = self.conn.cursor()
-            cursor.execute(
-                f'''SELECT COUNT(*) FROM "{table_name}" WHERE symbol = %s AND timeframe = %s''',
-                (symbol, timeframe)
-            )
-            count = cursor.fetchone()[0]
-            cursor.close()
-            return count
+            with self._cursor(cursor) as cursor:
+                cursor.execute(
+                    f'''SELECT COUNT(*) FROM "{table_name}" WHERE symbol = %s AND timeframe = %s''',
+                    (symbol, timeframe)
+                )
+                count = cursor.fetchone()[0]
+                return count
         except Exception as e:
-            logger.error(f"Error counting {level_type} levels: {e}")
+            logger.error("Error counting %s levels: %s", level_type, e)
             raise
 
 
@@ -207,9 +494,10 @@ def test_btc_weekly_insert():
     candle_records = fetcher.prepare_for_insert(df)
     print(f"   ✓ Prepared {len(candle_records)} candle records")
     
-    # Extract levels (high and low from each candle)
-    high_records = [(row['high'], row['timestamp']) for _, row in df.iterrows()]
-    low_records = [(row['low'], row['timestamp']) for _, row in df.iterrows()]
+    # Extract levels (high and low from each candle), column-wise instead of row by row
+    timestamps = df['timestamp'].tolist()
+    high_records = list(zip(df['high'].tolist(), timestamps))
+    low_records = list(zip(df['low'].tolist(), timestamps))
     print(f"   ✓ Extracted {len(high_records)} high levels")
     print(f"   ✓ Extracted {len(low_records)} low levels")
     
@@ -0,0 +1,94 @@
+"""
+Process-wide PostgreSQL connection pool
+Shared by DBManager, FakeoutDetector and LevelFilter so a cron run opens
+its connections once instead of once per class
+"""
+
+from psycopg2.pool import ThreadedConnectionPool
+from contextlib import contextmanager
+import atexit
+import threading
+from config import DB_URL
+
+MIN_CONNECTIONS = 1
+MAX_CONNECTIONS = 16
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+# Names PREPAREd on each pooled connection (prepared statements live per session)
+_prepared = {}
+
+
+def get_pool(db_url: str = None) -> ThreadedConnectionPool:
+    """
+    Get the pool for a connection string, creating it on first use
+    
+    Args:
+        db_url: PostgreSQL connection string (defaults to DB_URL)
+    
+    Returns:
+        ThreadedConnectionPool shared by every caller in the process
+    """
+    db_url = db_url or DB_URL
+    
+    with _pools_lock:
+        pool = _pools.get(db_url)
+        if pool is None or pool.closed:
+            pool = ThreadedConnectionPool(minconn=MIN_CONNECTIONS, maxconn=MAX_CONNECTIONS, dsn=db_url)
+            _pools[db_url] = pool
+        return pool
+
+
+@contextmanager
+def pool_cursor(db_url: str = None):
+    """
+    Check out a pooled connection for one transaction
+    Commits on success, rolls back on error, always returns the connection
+    """
+    pool = get_pool(db_url)
+    conn = pool.getconn()
+    try:
+        cursor = conn.cursor()
+        try:
+            yield cursor
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            cursor.close()
+    finally:
+        pool.putconn(conn)
+
+
+def prepared_statements(conn) -> set:
+    """Set of statement names already PREPAREd on a pooled connection"""
+    return _prepared.setdefault(conn, set())
+
+
+def prepare(cursor, name: str, statement: str):
+    """
+    PREPARE a statement once per connection so repeated calls skip parse/plan
+    
+    Args:
+        cursor: Cursor on the current connection
+        name: Prepared statement name
+        statement: PREPARE body, e.g. '(text) AS SELECT ... WHERE x = $1'
+    """
+    prepared = prepared_statements(cursor.connection)
+    if name in prepared:
+        return
+    cursor.execute(f"PREPARE {name} {statement}")
+    prepared.add(name)
+
+
+@atexit.register
+def close_all():
+    """Close every pooled connection (runs automatically at exit)"""
+    with _pools_lock:
+        for pool in _pools.values():
+            if not pool.closed:
+                pool.closeall()
+        _pools.clear()
+        _prepared.clear()
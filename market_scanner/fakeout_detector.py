@@ -3,55 +3,79 @@ Fakeout detection system
 Checks candles against levels and marks fakeouts
 """
 
-import psycopg2
-import os
-import logging
-from dotenv import load_dotenv
-from typing import List, Tuple, Optional
-from telegram_notifier import TelegramNotifier
-
-# Load environment variables
-load_dotenv()
+from psycopg2.extras import execute_values
+import threading
+import time
+import zlib
+import numpy as np
+from config import DB_URL, SYMBOLS_DB, setup_logger
+from db_pool import get_pool, pool_cursor, prepare
+from typing import Dict, List, Tuple, Optional
 
 # Setup logging
-os.makedirs('logs', exist_ok=True)
-logger = logging.getLogger(__name__)
-logger.setLevel(logging.INFO)
-
-fh = logging.FileHandler('logs/fakeout_detector.log')
-ch = logging.StreamHandler()
-formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
-fh.setFormatter(formatter)
-ch.setFormatter(formatter)
-logger.addHandler(fh)
-logger.addHandler(ch)
+logger = setup_logger(__name__, 'fakeout_detector.log')
 
 
 class FakeoutDetector:
     """Detects fakeouts by comparing candles against key levels"""
     
+    # Seconds a fetched level set is reused before it is read again
+    LEVELS_CACHE_TTL = 60
+    
     def __init__(self, db_url: str = None):
-        self.db_url = db_url or os.getenv('DB_URL')
+        self.db_url = db_url or DB_URL
         if not self.db_url:
             raise ValueError("DB_URL not provided")
         
-        self.conn = psycopg2.connect(self.db_url)
-        self.conn.autocommit = False
+        # Connections come from the process-wide pool shared with DBManager/LevelFilter
+        get_pool(self.db_url)
         
-        # Initialize Telegram notifier
-        try:
-            self.notifier = TelegramNotifier()
-            logger.info("Telegram notifier initialized")
-        except Exception as e:
-            logger.warning(f"Telegram notifier not available: {e}")
-            self.notifier = None
+        # Fakeouts found but not yet written: (symbol, timeframe) -> [(timestamp, type, level, candle)]
+        self._pending_marks = {}
+        self._pending_lock = threading.Lock()
+        
+        # (symbol, timeframe, level_type) -> (expires_at, float64 array of levels)
+        self._levels_cache = {}
+        
+        # (symbol, timeframe, level_type) -> (expires_at, (lowest, highest) or None)
+        self._bounds_cache = {}
+        
+        # Telegram notifier is created on the first alert (see _get_notifier)
+        self.notifier = None
+        self._notifier_loaded = False
         
         logger.info("Connected to database")
     
     def close(self):
-        if self.conn:
-            self.conn.close()
-            logger.info("Database connection closed")
+        # Don't lose marks buffered by a caller that never flushed
+        self.flush_marks()
+        
+        if self.notifier:
+            self.notifier.close()
+        
+        # Pooled connections stay open for the next user and are closed at exit
+        logger.info("Database connection closed")
+    
+    def _get_notifier(self):
+        """
+        Telegram notifier, created on first use
+        Most runs find no fakeouts, so they never import python-telegram-bot
+        or start its event loop thread
+        """
+        if not self._notifier_loaded:
+            self._notifier_loaded = True
+            try:
+                from telegram_notifier import TelegramNotifier
+                self.notifier = TelegramNotifier()
+                logger.info("Telegram notifier initialized")
+            except Exception as e:
+                logger.warning(f"Telegram notifier not available: {e}")
+                self.notifier = None
+        return self.notifier
+    
+    def _cursor(self):
+        """One transaction on a connection from the shared pool"""
+        return pool_cursor(self.db_url)
     
     def get_levels(self, symbol: str, timeframe: str, level_type: str) -> List[float]:
         """
@@ -65,38 +89,191 @@ class FakeoutDetector:
         Returns:
             List of level values
         """
+        return self.get_levels_bulk([symbol], timeframe, level_type)[symbol].tolist()
+    
+    def get_levels_bulk(self, symbols: List[str], timeframe: str, level_type: str) -> Dict[str, np.ndarray]:
+        """
+        Get all levels for several symbols in one query
+        Served from memory for LEVELS_CACHE_TTL seconds; only missing/expired symbols are queried
+        
+        Args:
+            symbols: e.g., ['btcusdt', 'ethusdt']
+            timeframe: 'daily', 'weekly', 'monthly'
+            level_type: 'high' or 'low'
+        
+        Returns:
+            dict of symbol -> float64 array of level values (ascending)
+        """
+        now = time.monotonic()
+        results = {}
+        missing = []
+        
+        for symbol in symbols:
+            cached = self._levels_cache.get((symbol, timeframe, level_type))
+            if cached and cached[0] > now:
+                results[symbol] = cached[1]
+            else:
+                missing.append(symbol)
+        
+        if not missing:
+            return results
+        
+        table_name = f'"{level_type}_levels"'
+        
+        with self._cursor() as cursor:
+            # Same text for every run on this connection, so parse/plan it once
+            statement_name = f"fakeout_{level_type}_levels"
+            prepare(cursor, statement_name, f"""
+                (text, text[]) AS
+                SELECT symbol, level FROM {table_name}
+                WHERE timeframe = $1 AND symbol = ANY($2)
+                ORDER BY symbol, level
+            """)
+            cursor.execute(f"EXECUTE {statement_name} (%s, %s)", (timeframe, missing))
+            
+            rows = cursor.fetchall()
+        
+        grouped = {symbol: [] for symbol in missing}
+        for symbol, level in rows:
+            grouped[symbol].append(level)
+        
+        # Arrays once here, so check_fakeout doesn't convert per candle
+        expires_at = now + self.LEVELS_CACHE_TTL
+        for symbol, levels in grouped.items():
+            results[symbol] = np.asarray(levels, dtype=np.float64)
+            self._levels_cache[(symbol, timeframe, level_type)] = (expires_at, results[symbol])
+        
+        return results
+    
+    def get_level_bounds(self, symbol: str, timeframe: str, level_type: str) -> Optional[Tuple[float, float]]:
+        """
+        Get the lowest and highest level for a symbol/timeframe
+        
+        Returns:
+            (lowest, highest) or None if the symbol has no levels
+        """
+        return self.get_level_bounds_bulk([symbol], timeframe, level_type)[symbol]
+    
+    def get_level_bounds_bulk(self, symbols: List[str], timeframe: str, 
+                              level_type: str) -> Dict[str, Optional[Tuple[float, float]]]:
+        """
+        Get the lowest and highest level of several symbols in one query
+        One row per symbol instead of every level; cached like get_levels_bulk
+        
+        Args:
+            symbols: e.g., ['btcusdt', 'ethusdt']
+            timeframe: 'daily', 'weekly', 'monthly'
+            level_type: 'high' or 'low'
+        
+        Returns:
+            dict of symbol -> (lowest, highest), or None for symbols without levels
+        """
+        now = time.monotonic()
+        results = {}
+        missing = []
+        
+        for symbol in symbols:
+            key = (symbol, timeframe, level_type)
+            cached = self._bounds_cache.get(key)
+            levels = self._levels_cache.get(key)
+            if cached and cached[0] > now:
+                results[symbol] = cached[1]
+            elif levels and levels[0] > now:
+                # Full level set already in memory (sorted), no need to ask the database
+                array = levels[1]
+                results[symbol] = (float(array[0]), float(array[-1])) if array.size else None
+            else:
+                missing.append(symbol)
+        
+        if not missing:
+            return results
+        
         table_name = f'"{level_type}_levels"'
         
-        cursor = self.conn.cursor()
-        cursor.execute(f"""
-            SELECT level FROM {table_name}
-            WHERE symbol = %s AND timeframe = %s
-            ORDER BY level
-        """, (symbol, timeframe))
+        with self._cursor() as cursor:
+            statement_name = f"fakeout_{level_type}_bounds"
+            prepare(cursor, statement_name, f"""
+                (text, text[]) AS
+                SELECT symbol, MIN(level), MAX(level) FROM {table_name}
+                WHERE timeframe = $1 AND symbol = ANY($2)
+                GROUP BY symbol
+            """)
+            cursor.execute(f"EXECUTE {statement_name} (%s, %s)", (timeframe, missing))
+            
+            rows = cursor.fetchall()
+        
+        bounds = {symbol: None for symbol in missing}
+        for symbol, lowest, highest in rows:
+            bounds[symbol] = (lowest, highest)
+        
+        expires_at = now + self.LEVELS_CACHE_TTL
+        for symbol, symbol_bounds in bounds.items():
+            results[symbol] = symbol_bounds
+            self._bounds_cache[(symbol, timeframe, level_type)] = (expires_at, symbol_bounds)
         
-        results = [row[0] for row in cursor.fetchall()]
-        cursor.close()
         return results
     
+    def invalidate_levels(self):
+        """Drop cached levels (after levels were inserted or filtered)"""
+        self._levels_cache.clear()
+        self._bounds_cache.clear()
+    
+    def get_latest_candles(self, symbols: List[str], timeframe: str) -> Dict[str, dict]:
+        """
+        Get the latest candle of several symbols in one round trip
+        
+        Returns:
+            dict of symbol -> candle dict (symbols with empty tables are left out)
+        """
+        selects = [
+            f"""(SELECT %s AS symbol, timestamp, open, high, low, close, is_fakeout
+                FROM "{symbol}_{timeframe}"
+                ORDER BY timestamp DESC
+                LIMIT 1)"""
+            for symbol in symbols
+        ]
+        
+        with self._cursor() as cursor:
+            # Table names can't be parameters, so each timeframe/symbol set gets its own statement
+            query = cursor.mogrify(" UNION ALL ".join(selects), tuple(symbols)).decode()
+            statement_name = f"fakeout_latest_{zlib.crc32(query.encode()):08x}"
+            prepare(cursor, statement_name, f"AS {query}")
+            cursor.execute(f"EXECUTE {statement_name}")
+            rows = cursor.fetchall()
+        
+        return {
+            row[0]: {
+                'timestamp': row[1],
+                'open': row[2],
+                'high': row[3],
+                'low': row[4],
+                'close': row[5],
+                'is_fakeout': row[6]
+            }
+            for row in rows
+        }
+    
     def get_latest_candle(self, symbol: str, timeframe: str) -> Optional[dict]:
         """
-        Get the most recently inserted candle from a table (by ID, not timestamp)
+        Get the latest candle from a table, by timestamp (not ID)
+        The timestamp primary key serves ORDER BY timestamp DESC LIMIT 1 as a
+        one-row index scan, and a backfilled or re-inserted row can't outrank
+        the newest candle the way a higher ID could
         
         Returns:
             dict with candle data or None
         """
         table_name = f'"{symbol}_{timeframe}"'
         
-        cursor = self.conn.cursor()
-        cursor.execute(f"""
-            SELECT timestamp, open, high, low, close, is_fakeout
-            FROM {table_name}
-            ORDER BY id DESC
-            LIMIT 1
-        """)
-        
-        row = cursor.fetchone()
-        cursor.close()
+        with self._cursor() as cursor:
+            cursor.execute(f"""
+                SELECT timestamp, open, high, low, close, is_fakeout
+                FROM {table_name}
+                ORDER BY timestamp DESC
+                LIMIT 1
+            """)
+            
+            row = cursor.fetchone()
         
         if row:
             return {
@@ -109,13 +286,36 @@ class FakeoutDetector:
             }
         return None
     
+    def could_fake_out(self, candle: dict, bounds: Optional[Tuple[float, float]], level_type: str) -> bool:
+        """
+        Whether any level within bounds could be faked out by a candle
+        A high fakeout needs a level between close and high, a low fakeout one between low and close
+        
+        Args:
+            candle: dict with OHLC data
+            bounds: (lowest, highest) level, or None if there are no levels
+            level_type: 'high' or 'low'
+        
+        Returns:
+            False if check_fakeout can't find anything, True if the levels need checking
+        """
+        if bounds is None:
+            return False
+        
+        lowest, highest = bounds
+        
+        if level_type == 'high':
+            return candle['high'] > lowest and candle['close'] < highest
+        
+        return candle['low'] < highest and candle['close'] > lowest
+    
     def check_fakeout(self, candle: dict, levels: List[float], level_type: str) -> Optional[Tuple[str, float]]:
         """
         Check if a candle faked out any levels
         
         Args:
             candle: dict with OHLC data
-            levels: list of level values to check
+            levels: list or array of level values to check
             level_type: 'high' or 'low'
         
         Returns:
@@ -129,26 +329,34 @@ class FakeoutDetector:
         low = candle['low']
         close = candle['close']
         
+        levels = np.asarray(levels, dtype=np.float64)
+        if len(levels) == 0:
+            return None
+        
+        # One vectorized compare over all levels; the first match wins as before
         if level_type == 'high':
             # Check for high fakeouts
-            for level in levels:
-                if high > level and close < level:
-                    logger.info(f"High fakeout detected at {level:.2f}")
-                    return ('high', level)
+            matches = np.flatnonzero((levels < high) & (levels > close))
+            if matches.size:
+                level = float(levels[matches[0]])
+                logger.info(f"High fakeout detected at {level:.2f}")
+                return ('high', level)
         
         elif level_type == 'low':
             # Check for low fakeouts
-            for level in levels:
-                if low < level and close > level:
-                    logger.info(f"Low fakeout detected at {level:.2f}")
-                    return ('low', level)
+            matches = np.flatnonzero((levels > low) & (levels < close))
+            if matches.size:
+                level = float(levels[matches[0]])
+                logger.info(f"Low fakeout detected at {level:.2f}")
+                return ('low', level)
         
         return None
     
     def mark_fakeout(self, symbol: str, timeframe: str, timestamp, fakeout_type: str, 
                     fakeout_level: float, candle: dict = None):
         """
-        Mark a candle as a fakeout in the database and send Telegram notification
+        Queue a candle to be marked as a fakeout
+        Written (and alerted) by flush_marks, which check_all_symbols and close call
         
         Args:
             symbol: e.g., 'btcusdt'
@@ -158,38 +366,69 @@ class FakeoutDetector:
             fakeout_level: the level that was faked out
             candle: dict with candle data for notification
         """
-        table_name = f'"{symbol}_{timeframe}"'
+        with self._pending_lock:
+            self._pending_marks.setdefault((symbol, timeframe), []).append(
+                (timestamp, fakeout_type, fakeout_level, candle)
+            )
+    
+    def flush_marks(self):
+        """
+        Write all queued fakeout marks in one transaction, then send their Telegram notifications
+        One UPDATE ... FROM (VALUES ...) per table, one commit for all of them, one
+        Telegram message for as many alerts as fit
+        """
+        with self._pending_lock:
+            pending, self._pending_marks = self._pending_marks, {}
+        
+        if not pending:
+            return
         
         try:
-            cursor = self.conn.cursor()
-            cursor.execute(f"""
-                UPDATE {table_name}
-                SET is_fakeout = TRUE,
-                    fakeout_type = %s,
-                    fakeout_level = %s
-                WHERE timestamp = %s
-            """, (fakeout_type, fakeout_level, timestamp))
-            
-            self.conn.commit()
-            cursor.close()
-            logger.info(f"Marked {symbol} {timeframe} candle at {timestamp} as {fakeout_type} fakeout")
-            
-            # Send Telegram notification
-            if self.notifier and candle:
-                try:
-                    self.notifier.send_fakeout_alert(symbol, timeframe, fakeout_type, 
-                                                     fakeout_level, candle)
-                except Exception as e:
-                    logger.error(f"Failed to send Telegram notification: {e}")
+            with self._cursor() as cursor:
+                for (symbol, timeframe), marks in pending.items():
+                    execute_values(cursor, f"""
+                        UPDATE "{symbol}_{timeframe}" AS c
+                        SET is_fakeout = TRUE,
+                            fakeout_type = v.fakeout_type,
+                            fakeout_level = v.fakeout_level
+                        FROM (VALUES %s) AS v (timestamp, fakeout_type, fakeout_level)
+                        WHERE c.timestamp = v.timestamp
+                    """, [mark[:3] for mark in marks],
+                        template="(%s::timestamptz, %s, %s::double precision)")
             
         except Exception as e:
-            self.conn.rollback()
-            logger.error(f"Error marking fakeout: {e}")
+            logger.error(f"Error marking fakeouts: {e}")
             raise
+        
+        # A scan ends with its marks; the next one reads levels fresh
+        self.invalidate_levels()
+        
+        alerts = []
+        for (symbol, timeframe), marks in pending.items():
+            for timestamp, fakeout_type, fakeout_level, candle in marks:
+                logger.info(f"Marked {symbol} {timeframe} candle at {timestamp} as {fakeout_type} fakeout")
+                
+                if candle:
+                    alerts.append({
+                        'symbol': symbol,
+                        'timeframe': timeframe,
+                        'fakeout_type': fakeout_type,
+                        'level': fakeout_level,
+                        'candle': candle
+                    })
+        
+        # Send Telegram notifications, batched into as few messages as fit
+        if alerts and self._get_notifier():
+            try:
+                self.notifier.send_fakeout_batch(alerts)
+            except Exception as e:
+                logger.error(f"Failed to send Telegram notification: {e}")
     
-    def check_hourly_fakeouts(self, symbol: str) -> bool:
+    def check_hourly_fakeouts(self, symbol: str, candle: dict = None,
+                    high_levels: List[float] = None, low_levels: List[float] = None) -> bool:
         """
         Check latest 1h candle against daily levels
+        Candle and levels are fetched unless preloaded by check_all_symbols
         
         Returns:
             True if fakeout detected, False otherwise
@@ -197,7 +436,8 @@ class FakeoutDetector:
         logger.info(f"Checking 1h fakeouts for {symbol}")
         
         # Get latest 1h candle
-        candle = self.get_latest_candle(symbol, '1h')
+        if candle is None:
+            candle = self.get_latest_candle(symbol, '1h')
         if not candle:
             logger.warning(f"No 1h candle found for {symbol}")
             return False
@@ -208,8 +448,10 @@ class FakeoutDetector:
             return False
         
         # Get daily levels
-        high_levels = self.get_levels(symbol, 'daily', 'high')
-        low_levels = self.get_levels(symbol, 'daily', 'low')
+        if high_levels is None:
+            high_levels = self.get_levels(symbol, 'daily', 'high')
+        if low_levels is None:
+            low_levels = self.get_levels(symbol, 'daily', 'low')
         
         logger.info(f"Checking against {len(high_levels)} high levels and {len(low_levels)} low levels")
         
@@ -230,16 +472,19 @@ class FakeoutDetector:
         logger.info("No fakeout detected")
         return False
     
-    def check_4h_fakeouts(self, symbol: str) -> bool:
+    def check_4h_fakeouts(self, symbol: str, candle: dict = None,
+                    high_levels: List[float] = None, low_levels: List[float] = None) -> bool:
         """
         Check latest 4h candle against weekly levels
+        Candle and levels are fetched unless preloaded by check_all_symbols
         
         Returns:
             True if fakeout detected, False otherwise
         """
         logger.info(f"Checking 4h fakeouts for {symbol}")
         
-        candle = self.get_latest_candle(symbol, '4h')
+        if candle is None:
+            candle = self.get_latest_candle(symbol, '4h')
         if not candle:
             logger.warning(f"No 4h candle found for {symbol}")
             return False
@@ -248,8 +493,10 @@ class FakeoutDetector:
             logger.info(f"Candle already marked as fakeout, skipping")
             return False
         
-        high_levels = self.get_levels(symbol, 'weekly', 'high')
-        low_levels = self.get_levels(symbol, 'weekly', 'low')
+        if high_levels is None:
+            high_levels = self.get_levels(symbol, 'weekly', 'high')
+        if low_levels is None:
+            low_levels = self.get_levels(symbol, 'weekly', 'low')
         
         logger.info(f"Checking against {len(high_levels)} high levels and {len(low_levels)} low levels")
         
@@ -270,16 +517,19 @@ class FakeoutDetector:
         logger.info("No fakeout detected")
         return False
     
-    def check_daily_fakeouts(self, symbol: str) -> bool:
+    def check_daily_fakeouts(self, symbol: str, candle: dict = None,
+                    high_levels: List[float] = None, low_levels: List[float] = None) -> bool:
         """
         Check latest 1d candle against monthly levels
+        Candle and levels are fetched unless preloaded by check_all_symbols
         
         Returns:
             True if fakeout detected, False otherwise
         """
         logger.info(f"Checking daily fakeouts for {symbol}")
         
-        candle = self.get_latest_candle(symbol, '1d')
+        if candle is None:
+            candle = self.get_latest_candle(symbol, '1d')
         if not candle:
             logger.warning(f"No daily candle found for {symbol}")
             return False
@@ -288,8 +538,10 @@ class FakeoutDetector:
             logger.info(f"Candle already marked as fakeout, skipping")
             return False
         
-        high_levels = self.get_levels(symbol, 'monthly', 'high')
-        low_levels = self.get_levels(symbol, 'monthly', 'low')
+        if high_levels is None:
+            high_levels = self.get_levels(symbol, 'monthly', 'high')
+        if low_levels is None:
+            low_levels = self.get_levels(symbol, 'monthly', 'low')
         
         logger.info(f"Checking against {len(high_levels)} high levels and {len(low_levels)} low levels")
         
@@ -317,25 +569,48 @@ class FakeoutDetector:
         Args:
             timeframe: '1h', '4h', or '1d'
         """
-        symbols = ['btcusdt', 'ethusdt', 'ltcusdt', 'xrpusdt', 
-                   'dogeusdt', 'linkusdt', 'adausdt']
+        symbols = SYMBOLS_DB
         
         method_map = {
-            '1h': self.check_hourly_fakeouts,
-            '4h': self.check_4h_fakeouts,
-            '1d': self.check_daily_fakeouts
+            '1h': (self.check_hourly_fakeouts, 'daily'),
+            '4h': (self.check_4h_fakeouts, 'weekly'),
+            '1d': (self.check_daily_fakeouts, 'monthly')
         }
         
         if timeframe not in method_map:
             raise ValueError(f"Invalid timeframe: {timeframe}")
         
-        check_method = method_map[timeframe]
+        check_method, level_timeframe = method_map[timeframe]
+        
+        # One query for every latest candle, then the level bounds of both sides
+        candles = self.get_latest_candles(symbols, timeframe)
+        unmarked = [symbol for symbol, candle in candles.items() if not candle['is_fakeout']]
+        high_bounds = self.get_level_bounds_bulk(unmarked, level_timeframe, 'high')
+        low_bounds = self.get_level_bounds_bulk(unmarked, level_timeframe, 'low')
+        
+        # Full level sets only for candles that reach into their range (usually none)
+        high_needed = [s for s in unmarked if self.could_fake_out(candles[s], high_bounds[s], 'high')]
+        low_needed = [s for s in unmarked if self.could_fake_out(candles[s], low_bounds[s], 'low')]
+        high_levels = self.get_levels_bulk(high_needed, level_timeframe, 'high')
+        low_levels = self.get_levels_bulk(low_needed, level_timeframe, 'low')
+        
+        logger.info(f"{len(high_needed)}/{len(unmarked)} symbols need high levels, "
+                    f"{len(low_needed)}/{len(unmarked)} need low levels")
+        
+        no_levels = np.empty(0, dtype=np.float64)
         fakeouts_found = 0
         
         for symbol in symbols:
-            if check_method(symbol):
+            if symbol not in candles:
+                logger.warning(f"No {timeframe} candle found for {symbol}")
+                continue
+            if check_method(symbol, candles[symbol], 
+                            high_levels.get(symbol, no_levels), low_levels.get(symbol, no_levels)):
                 fakeouts_found += 1
         
+        # Every mark from this run in one commit
+        self.flush_marks()
+        
         logger.info(f"Total fakeouts found for {timeframe}: {fakeouts_found}")
 
 
@@ -4,30 +4,24 @@ Fill historical data for all symbols - daily, weekly, monthly timeframes
 
 from data_fetcher import DataFetcher
 from db_manager import DBManager
-import logging
-import os
-import time
+from config import SYMBOLS_CCXT, SYMBOLS_DB, setup_logger
+from create_db_schema import finalize_indexes
+import sys
 
 # Setup logging
-os.makedirs('logs', exist_ok=True)
-logger = logging.getLogger(__name__)
-logger.setLevel(logging.INFO)
-
-fh = logging.FileHandler('logs/fill_historical.log')
-ch = logging.StreamHandler()
-formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
-fh.setFormatter(formatter)
-ch.setFormatter(formatter)
-logger.addHandler(fh)
-logger.addHandler(ch)
+logger = setup_logger(__name__, 'fill_historical.log')
 
 
 def fill_all_historical():
-    """Fill historical data for all 8 symbols across daily, weekly, monthly"""
+    """
+    Fill historical data for all 8 symbols across daily, weekly, monthly
+    
+    Returns:
+        False if building the indexes after the load failed
+    """
     
     # Symbols to process
-    symbols = ['BTC/USDT', 'ETH/USDT', 'LTC/USDT', 'XRP/USDT', 
-               'DOGE/USDT', 'LINK/USDT', 'ADA/USDT']
+    symbols = SYMBOLS_CCXT
     
     # Timeframes to backfill
     timeframes = ['1d', '1w', '1M']
@@ -51,9 +45,12 @@ def fill_all_historical():
     print(f"Symbols: {total_symbols} | Timeframes: {len(timeframes)} | Total: {total_operations}")
     print("="*70)
     
-    for symbol in symbols:
-        db_symbol = fetcher.get_symbol_for_db(symbol)
-        
+    # Every pair fetched up front, concurrently (DataFetcher.BACKFILL_WORKERS),
+    # with the indicators of all series calculated in one batch
+    print(f"\n→ Fetching {total_operations} candle series...")
+    frames = fetcher.backfill_historical_data(symbols, timeframes, limit=1000)
+    
+    for symbol, db_symbol in zip(symbols, SYMBOLS_DB):
         print(f"\n{'='*70}")
         print(f"Processing: {symbol} ({db_symbol})")
         print(f"{'='*70}")
@@ -63,60 +60,74 @@ def fill_all_historical():
                 completed += 1
                 print(f"\n[{completed}/{total_operations}] {symbol} - {timeframe}")
                 
-                # Fetch data with indicators
-                print(f"  → Fetching candles...")
-                df = fetcher.fetch_with_indicators(symbol, timeframe, limit=1000)
-                print(f"  ✓ Fetched {len(df)} complete candles")
-                
-                # Prepare candle records
+                # Insert-ready records with indicators
+                df = frames[symbol][timeframe]
+                if df is None:
+                    raise RuntimeError("fetching candles failed (see data_fetcher.log)")
                 candle_records = fetcher.prepare_for_insert(df)
+                print(f"  ✓ Fetched {len(candle_records)} complete candles")
                 
                 # Extract levels
-                high_records = [(row['high'], row['timestamp']) for _, row in df.iterrows()]
-                low_records = [(row['low'], row['timestamp']) for _, row in df.iterrows()]
-                
-                # Insert candles
-                print(f"  → Inserting candles into {db_symbol}_{timeframe}...")
-                db.insert_ohlcv(db_symbol, timeframe, candle_records)
-                
-                # Insert high levels
-                print(f"  → Inserting {len(high_records)} high levels...")
-                db.insert_levels(db_symbol, timeframe_map[timeframe], high_records, 'high')
+                high_records = [(record[2], record[0]) for record in candle_records]
+                low_records = [(record[3], record[0]) for record in candle_records]
                 
-                # Insert low levels
-                print(f"  → Inserting {len(low_records)} low levels...")
-                db.insert_levels(db_symbol, timeframe_map[timeframe], low_records, 'low')
+                # One transaction (one commit) per pair: a failed pair rolls back
+                # on its own and finished pairs stay committed
+                with db.transaction(bulk=True) as cursor:
+                    # Insert candles (plain binary COPY when the table is still empty)
+                    print(f"  → Inserting candles into {db_symbol}_{timeframe}...")
+                    if db.get_candle_count(db_symbol, timeframe, cursor=cursor) == 0:
+                        db.copy_ohlcv(db_symbol, timeframe, candle_records, cursor=cursor)
+                    else:
+                        db.insert_ohlcv_copy(db_symbol, timeframe, candle_records, cursor=cursor)
+                    
+                    # Insert high levels
+                    print(f"  → Inserting {len(high_records)} high levels...")
+                    db.copy_levels(db_symbol, timeframe_map[timeframe], high_records, 'high', cursor=cursor)
+                    
+                    # Insert low levels
+                    print(f"  → Inserting {len(low_records)} low levels...")
+                    db.copy_levels(db_symbol, timeframe_map[timeframe], low_records, 'low', cursor=cursor)
                 
                 print(f"  ✓ Completed {symbol} {timeframe}")
                 
-                # Small delay to respect rate limits
-                time.sleep(0.2)
-                
             except Exception as e:
                 logger.error(f"Error processing {symbol} {timeframe}: {e}")
                 print(f"  ✗ FAILED: {e}")
                 continue
     
-    db.close()
+    # Indexes are built once after the load instead of row by row during it
+    indexed = finalize_indexes()
     
     print("\n" + "="*70)
-    print("✓ Historical data backfill complete!")
+    if indexed:
+        print("✓ Historical data backfill complete!")
+    else:
+        print("✗ Candles loaded, but building the indexes failed (see above)")
+        print("  Retry with: python create_db_schema.py --indexes")
     print("="*70)
     
-    # Summary
+    # Summary: every count in one query
     print("\n--- Summary ---")
-    for symbol in symbols:
-        db_symbol = fetcher.get_symbol_for_db(symbol)
+    db_symbols = SYMBOLS_DB
+    try:
+        counts = db.get_candle_counts(db_symbols, timeframes)
+    except Exception:
+        counts = None
+    
+    for symbol, db_symbol in zip(symbols, db_symbols):
         print(f"\n{symbol} ({db_symbol}):")
         
-        db_temp = DBManager()
         for timeframe in timeframes:
             try:
-                count = db_temp.get_candle_count(db_symbol, timeframe)
+                # Table by table only if the combined query failed (e.g. a missing table)
+                count = counts[(db_symbol, timeframe)] if counts else db.get_candle_count(db_symbol, timeframe)
                 print(f"  {timeframe}: {count} candles")
             except:
                 print(f"  {timeframe}: ERROR")
-        db_temp.close()
+    
+    db.close()
+    return indexed
 
 
 if __name__ == '__main__':
@@ -128,6 +139,7 @@ if __name__ == '__main__':
     response = input("\nContinue? (yes/no): ")
     
     if response.lower() == 'yes':
-        fill_all_historical()
+        if not fill_all_historical():
+            sys.exit(1)
     else:
         print("Cancelled.")
\ No newline at end of file
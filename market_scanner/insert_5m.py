@@ -1,69 +1,119 @@
 """
 Cron job: Insert latest 5m candles for all symbols
-Run every 5 minutes at :05 seconds
+Run every 5 minutes at :05 seconds, or once with --daemon to schedule itself
 """
 
 from data_fetcher import DataFetcher
 from db_manager import DBManager
-import logging
-import os
+from config import SYMBOLS_CCXT, SYMBOLS_DB, setup_logger
+import asyncio
+import sys
+import time
 from datetime import datetime, timezone
-from dotenv import load_dotenv
-
-# Load environment variables from .env file
-load_dotenv()
 
 # Setup logging
-os.makedirs('logs', exist_ok=True)
-logger = logging.getLogger(__name__)
-logger.setLevel(logging.INFO)
+logger = setup_logger(__name__, 'insert_5m.log')
 
-fh = logging.FileHandler('logs/insert_5m.log')
-ch = logging.StreamHandler()
-formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
-fh.setFormatter(formatter)
-ch.setFormatter(formatter)
-logger.addHandler(fh)
-logger.addHandler(ch)
 
+SYMBOLS = SYMBOLS_CCXT
+DB_SYMBOLS = SYMBOLS_DB
 
-def insert_5m_candles():
-    """Insert latest 5m candle for all symbols"""
-    
-    symbols = ['BTC/USDT', 'ETH/USDT', 'LTC/USDT', 'XRP/USDT', 
-               'DOGE/USDT', 'LINK/USDT', 'ADA/USDT']
-    
-    fetcher = DataFetcher()
-    db = DBManager()
+# Daemon mode: same schedule as the cron entry, 5 seconds past each 5-minute mark
+INTERVAL_SECONDS = 5 * 60
+OFFSET_SECONDS = 5
+
+
+def store_5m_candles(fetcher: DataFetcher, db: DBManager, frames: dict):
+    """
+    Insert the last complete 5m candle of every fetched symbol
     
+    Args:
+        fetcher: DataFetcher (record preparation)
+        db: Open DBManager
+        frames: Result of fetch_many_with_indicators
+    """
     logger.info(f"=== Starting 5m candle insertion at {datetime.now(timezone.utc)} UTC ===")
     
     success = 0
     failed = 0
+    records_by_symbol = {}
     
-    for symbol in symbols:
+    for symbol, db_symbol in zip(SYMBOLS, DB_SYMBOLS):
         try:
-            db_symbol = fetcher.get_symbol_for_db(symbol)
-            
-            # Fetch last 60 candles for indicators
-            df = fetcher.fetch_with_indicators(symbol, '5m', limit=60)
+            df = frames[symbol]
+            if isinstance(df, Exception):
+                raise df
             last_candle = df.tail(1)
             
-            # Prepare and insert
-            records = fetcher.prepare_for_insert(last_candle)
-            db.insert_ohlcv(db_symbol, '5m', records)
-            
-            logger.info(f"✓ {symbol} 5m candle inserted")
-            success += 1
+            # Prepare now, insert all symbols together below
+            records_by_symbol[db_symbol] = fetcher.prepare_for_insert(last_candle)
             
         except Exception as e:
             logger.error(f"✗ {symbol} 5m failed: {e}")
             failed += 1
     
-    db.close()
+    # One transaction (one commit) for every symbol's candle
+    try:
+        db.insert_ohlcv_batch('5m', records_by_symbol)
+        for db_symbol in records_by_symbol:
+            logger.info(f"✓ {db_symbol} 5m candle inserted")
+        success += len(records_by_symbol)
+        
+    except Exception as e:
+        logger.error(f"✗ 5m batch insert failed: {e}")
+        failed += len(records_by_symbol)
     
     logger.info(f"=== 5m insertion complete: {success} success, {failed} failed ===")
 
 
+def insert_5m_candles():
+    """Insert latest 5m candle for all symbols (one-shot, for cron)"""
+    
+    fetcher = DataFetcher()
+    db = DBManager()
+    
+    # Fetch last 60 candles for indicators, all symbols concurrently
+    frames = fetcher.fetch_many_with_indicators(SYMBOLS, '5m', limit=60)
+    store_5m_candles(fetcher, db, frames)
+    
+    db.close()
+
+
+def seconds_until_next_run() -> float:
+    """Seconds until the next 5-minute boundary plus OFFSET_SECONDS"""
+    now = time.time()
+    next_run = (now - OFFSET_SECONDS) // INTERVAL_SECONDS * INTERVAL_SECONDS + INTERVAL_SECONDS + OFFSET_SECONDS
+    return next_run - now
+
+
+async def run_daemon():
+    """
+    Long-running alternative to the cron entry
+    Keeps the Binance client (and its open HTTPS connections) and the
+    database pool alive between runs instead of rebuilding them every 5 minutes
+    """
+    fetcher = DataFetcher()
+    db = DBManager()
+    exchange = fetcher.create_async_exchange()
+    
+    logger.info("5m insert daemon started")
+    
+    try:
+        while True:
+            await asyncio.sleep(seconds_until_next_run())
+            try:
+                frames = await fetcher.fetch_many_with_indicators_async(SYMBOLS, '5m', limit=60, exchange=exchange)
+                store_5m_candles(fetcher, db, frames)
+            except Exception as e:
+                logger.error(f"5m run failed: {e}")
+    finally:
+        await exchange.close()
+        db.close()
+
+
 if __name__ == '__main__':
-    insert_5m_candles()
\ No newline at end of file
+    # `python insert_5m.py --daemon` replaces the cron entry with one long-lived process
+    if '--daemon' in sys.argv[1:]:
+        asyncio.run(run_daemon())
+    else:
+        insert_5m_candles()
\ No newline at end of file
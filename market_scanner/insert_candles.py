@@ -0,0 +1,164 @@
+"""
+Cron job: Insert latest candles of one or more timeframes for all symbols
+Daily, weekly and monthly runs also insert levels and filter them;
+1h, 4h and daily runs then check for fakeouts
+
+Usage: python insert_candles.py 1d [1w 1M ...]
+Timeframes that are due at the same time can share one process (one set of
+imports, one exchange metadata load, one connection pool)
+"""
+
+from data_fetcher import DataFetcher
+from db_manager import DBManager
+from config import SYMBOLS_CCXT, SYMBOLS_DB, setup_logger
+import argparse
+from datetime import datetime, timezone
+
+# Setup logging
+logger = setup_logger(__name__, 'insert_candles.log')
+
+
+# Timeframe -> (name in logs and levels table, inserts levels, checks fakeouts)
+TIMEFRAMES = {
+    '1h': ('1h', False, True),
+    '4h': ('4h', False, True),
+    '1d': ('daily', True, True),
+    '1w': ('weekly', True, False),
+    '1M': ('monthly', True, False)
+}
+
+
+# One fakeout detector per process, shared by every timeframe of the run so
+# its level cache spans them; created on the first fakeout check
+_detector = None
+
+
+def _get_detector():
+    """The process's FakeoutDetector, created on first use"""
+    global _detector
+    if _detector is None:
+        from fakeout_detector import FakeoutDetector
+        _detector = FakeoutDetector()
+    return _detector
+
+
+def insert_candles(timeframe: str):
+    """
+    Insert latest candle of a timeframe for all symbols
+    + levels and filtering, + fakeout check, where the timeframe has them
+    
+    Args:
+        timeframe: '1h', '4h', '1d', '1w' or '1M'
+    """
+    if timeframe not in TIMEFRAMES:
+        raise ValueError(f"Invalid timeframe: {timeframe}")
+    
+    name, with_levels, with_fakeouts = TIMEFRAMES[timeframe]
+    symbols = SYMBOLS_CCXT
+    
+    fetcher = DataFetcher()
+    db = DBManager()
+    filter_obj = None
+    if with_levels:
+        # Imported per run type: 1h/4h runs never load the filter,
+        # weekly/monthly runs never load the detector (and Telegram)
+        from level_filter import LevelFilter
+        filter_obj = LevelFilter()
+    
+    logger.info(f"=== Starting {name} candle insertion at {datetime.now(timezone.utc)} UTC ===")
+    
+    success = 0
+    skipped = 0
+    failed = 0
+    
+    # Fetch last 60 candles for indicators, all symbols concurrently
+    frames = fetcher.fetch_many_with_indicators(symbols, timeframe, limit=60)
+    
+    # Candles already stored by an earlier run are skipped, so their levels
+    # aren't inserted (and filtered) a second time
+    try:
+        stored = db.get_latest_timestamps(SYMBOLS_DB, timeframe)
+    except Exception as e:
+        logger.warning(f"Could not read stored {name} timestamps, inserting every candle: {e}")
+        stored = {}
+    
+    records_by_symbol = {}
+    highs_by_symbol = {}
+    lows_by_symbol = {}
+    
+    for symbol, db_symbol in zip(symbols, SYMBOLS_DB):
+        try:
+            df = frames[symbol]
+            if isinstance(df, Exception):
+                raise df
+            last_candle = df.tail(1)
+            
+            if db_symbol in stored and last_candle.iloc[0]['timestamp'] <= stored[db_symbol]:
+                logger.info(f"- {db_symbol} {name} candle at {last_candle.iloc[0]['timestamp']} already stored, skipping")
+                skipped += 1
+                continue
+            
+            # Prepare candle
+            records_by_symbol[db_symbol] = fetcher.prepare_for_insert(last_candle)
+            
+            # Extract levels
+            if with_levels:
+                timestamp = last_candle.iloc[0]['timestamp']
+                highs_by_symbol[db_symbol] = [(float(last_candle.iloc[0]['high']), timestamp)]
+                lows_by_symbol[db_symbol] = [(float(last_candle.iloc[0]['low']), timestamp)]
+            
+        except Exception as e:
+            logger.error(f"✗ {symbol} {name} failed: {e}")
+            failed += 1
+    
+    # Candles (and levels + filtering) of every symbol in one transaction (one commit)
+    try:
+        with db.transaction() as cursor:
+            db.insert_ohlcv_batch(timeframe, records_by_symbol, cursor=cursor)
+            
+            if with_levels:
+                db.insert_levels_batch(name, highs_by_symbol, 'high', cursor=cursor)
+                db.insert_levels_batch(name, lows_by_symbol, 'low', cursor=cursor)
+                
+                # One filter statement per side for all symbols
+                filter_obj.filter_timeframe_bulk(list(records_by_symbol), name, cursor=cursor)
+        
+        # Levels just changed, so cached level sets are stale
+        if with_levels and _detector is not None:
+            _detector.invalidate_levels()
+        
+        for db_symbol in records_by_symbol:
+            if with_levels:
+                logger.info(f"✓ {db_symbol} {name} candle + levels inserted and filtered")
+            else:
+                logger.info(f"✓ {db_symbol} {name} candle inserted")
+        success += len(records_by_symbol)
+        
+    except Exception as e:
+        logger.error(f"✗ {name} batch insert failed: {e}")
+        failed += len(records_by_symbol)
+    
+    db.close()
+    if filter_obj:
+        filter_obj.close()
+    
+    logger.info(f"=== {name.capitalize()} insertion complete: {success} success, {skipped} skipped, {failed} failed ===")
+    
+    # Check for fakeouts
+    if with_fakeouts:
+        logger.info("=== Checking for fakeouts ===")
+        _get_detector().check_all_symbols(timeframe)
+        logger.info("=== Fakeout check complete ===")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Insert latest candles for all symbols")
+    parser.add_argument('timeframes', nargs='+', choices=list(TIMEFRAMES),
+                        help="Timeframes to insert, e.g. 1h 4h 1d")
+    args = parser.parse_args()
+    
+    for timeframe in args.timeframes:
+        insert_candles(timeframe)
+    
+    if _detector is not None:
+        _detector.close()
\ No newline at end of file
@@ -3,44 +3,43 @@ Level filtering for high and low levels
 Filters to keep only significant levels based on greedy algorithm
 """
 
-import psycopg2
-import os
-import logging
-from dotenv import load_dotenv
-
-# Load environment variables from .env file
-load_dotenv()
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Dict, List, Tuple
+from config import DB_URL, SYMBOLS_DB, TIMEFRAMES_HL, setup_logger
+from db_pool import get_pool, pool_cursor
 
 # Setup logging
-os.makedirs('logs', exist_ok=True)
-logger = logging.getLogger(__name__)
-logger.setLevel(logging.INFO)
-
-fh = logging.FileHandler('logs/level_filter.log')
-ch = logging.StreamHandler()
-formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
-fh.setFormatter(formatter)
-ch.setFormatter(formatter)
-logger.addHandler(fh)
-logger.addHandler(ch)
+logger = setup_logger(__name__, 'level_filter.log')
 
 
 class LevelFilter:
     """Filters high and low levels using greedy decreasing/increasing algorithm"""
     
+    # Symbol/timeframe combinations are filtered concurrently, one pooled connection each
+    FILTER_WORKERS = 8
+    
     def __init__(self, db_url: str = None):
-        self.db_url = db_url or os.getenv('DB_URL')
+        self.db_url = db_url or DB_URL
         if not self.db_url:
             raise ValueError("DB_URL not provided")
         
-        self.conn = psycopg2.connect(self.db_url)
-        self.conn.autocommit = False
+        # Connections come from the process-wide pool shared with DBManager/FakeoutDetector
+        get_pool(self.db_url)
         logger.info("Connected to database")
     
     def close(self):
-        if self.conn:
-            self.conn.close()
-            logger.info("Database connection closed")
+        # Pooled connections stay open for the next user and are closed at exit
+        logger.info("Database connection closed")
+    
+    @contextmanager
+    def _cursor(self, cursor=None):
+        """Join the caller's transaction, or run one on a connection from the shared pool"""
+        if cursor is not None:
+            yield cursor
+            return
+        with pool_cursor(self.db_url) as cursor:
+            yield cursor
     
     def get_levels(self, symbol: str, timeframe: str, level_type: str):
         """
@@ -56,20 +55,97 @@ class LevelFilter:
         """
         table_name = f'"{level_type}_levels"'
         
-        cursor = self.conn.cursor()
-        cursor.execute(f"""
-            SELECT id, level, timestamp 
-            FROM {table_name}
-            WHERE symbol = %s AND timeframe = %s
-            ORDER BY timestamp ASC
-        """, (symbol, timeframe))
+        with self._cursor() as cursor:
+            cursor.execute(f"""
+                SELECT id, level, timestamp 
+                FROM {table_name}
+                WHERE symbol = %s AND timeframe = %s
+                ORDER BY timestamp ASC
+            """, (symbol, timeframe))
+            
+            results = cursor.fetchall()
+        logger.info("Fetched %d %s levels for %s %s", len(results), level_type, symbol, timeframe)
+        return results
+    
+    def _filter_levels(self, symbol: str, timeframe: str, level_type: str, cursor=None):
+        """
+        Apply the greedy filter to one symbol (see _filter_levels_bulk)
+        
+        Args:
+            symbol: e.g., 'btcusdt'
+            timeframe: 'daily', 'weekly', 'monthly'
+            level_type: 'high' or 'low'
+            cursor: Cursor of an open transaction to join, or None for its own
+        
+        Returns:
+            (kept_count, deleted_count)
+        """
+        return self._filter_levels_bulk([symbol], timeframe, level_type, cursor)[symbol]
+    
+    def _filter_levels_bulk(self, symbols: List[str], timeframe: str, level_type: str, cursor=None) -> Dict[str, Tuple[int, int]]:
+        """
+        Apply the greedy filter server-side in a single statement for several symbols
+        A level survives only if it beats every newer level of its symbol (higher for
+        highs, lower for lows); the running extreme over newer rows is a window aggregate
+        
+        Args:
+            symbols: e.g., ['btcusdt', 'ethusdt']
+            timeframe: 'daily', 'weekly', 'monthly'
+            level_type: 'high' or 'low'
+            cursor: Cursor of an open transaction to join, or None for its own
+        
+        Returns:
+            dict of symbol -> (kept_count, deleted_count)
+        """
+        table_name = f'"{level_type}_levels"'
+        newer_extreme, beaten = ('MAX', '<=') if level_type == 'high' else ('MIN', '>=')
+        
+        with self._cursor(cursor) as cursor:
+            # PARTITION BY symbol keeps symbols independent; the index order
+            # (symbol, timeframe, timestamp DESC, id DESC) matches the window
+            cursor.execute(f"""
+                WITH ranked AS (
+                    SELECT id, symbol, level, {newer_extreme}(level) OVER (
+                        PARTITION BY symbol
+                        ORDER BY timestamp DESC, id DESC
+                        ROWS BETWEEN UNBOUNDED PRECEDING AND 1 PRECEDING
+                    ) AS newer_extreme
+                    FROM {table_name}
+                    WHERE symbol = ANY(%s) AND timeframe = %s
+                ),
+                deleted AS (
+                    DELETE FROM {table_name} AS l
+                    USING ranked AS r
+                    WHERE l.id = r.id
+                      AND r.newer_extreme IS NOT NULL
+                      AND r.level {beaten} r.newer_extreme
+                    RETURNING r.symbol
+                )
+                SELECT symbol, COUNT(*),
+                       (SELECT COUNT(*) FROM deleted AS d WHERE d.symbol = ranked.symbol)
+                FROM ranked
+                GROUP BY symbol
+            """, (list(symbols), timeframe))
+            
+            counts = {symbol: (total_count, deleted_count) for symbol, total_count, deleted_count in cursor.fetchall()}
+        
+        results = {}
+        for symbol in symbols:
+            total_count, deleted_count = counts.get(symbol, (0, 0))
+            kept_count = total_count - deleted_count
+            
+            if total_count == 0:
+                logger.info("No %s levels to filter", level_type)
+            elif deleted_count > 0:
+                logger.info("Filtered %ss for %s %s: kept %d, deleted %d", level_type, symbol, timeframe, kept_count, deleted_count)
+            else:
+                logger.info("No %ss to delete for %s %s", level_type, symbol, timeframe)
+            
+            results[symbol] = (kept_count, deleted_count)
         
-        results = cursor.fetchall()
-        cursor.close()
-        logger.info(f"Fetched {len(results)} {level_type} levels for {symbol} {timeframe}")
         return results
     
-    def filter_highs(self, symbol: str, timeframe: str):
+    def filter_highs(self, symbol: str, timeframe: str, cursor=None):
         """
         Filter high levels - most recent must be highest
         Keep only levels that form decreasing sequence from new to old
@@ -83,52 +159,9 @@ class LevelFilter:
         Returns:
             (kept_count, deleted_count)
         """
-        levels = self.get_levels(symbol, timeframe, 'high')
-        
-        if not levels:
-            logger.info("No high levels to filter")
-            return 0, 0
-        
-        logger.info(f"Filtering {len(levels)} high levels for {symbol} {timeframe}")
-        
-        keep_ids = []
-        levels_reversed = list(reversed(levels))
-        
-        # Keep most recent
-        most_recent_id, most_recent_level, most_recent_ts = levels_reversed[0]
-        keep_ids.append(most_recent_id)
-        max_kept = most_recent_level
-        logger.debug(f"Keeping most recent high: {most_recent_level:.2f} at {most_recent_ts}")
-        
-        # Go through older candles
-        for level_id, level, timestamp in levels_reversed[1:]:
-            if level > max_kept:
-                keep_ids.append(level_id)
-                max_kept = level
-                logger.debug(f"Keeping older high: {level:.2f} at {timestamp}")
-            else:
-                logger.debug(f"Deleting high: {level:.2f} at {timestamp} (not higher than {max_kept:.2f})")
-        
-        kept_count = len(keep_ids)
-        deleted_count = len(levels) - kept_count
-        
-        # Delete levels not in keep list
-        if deleted_count > 0:
-            cursor = self.conn.cursor()
-            cursor.execute("""
-                DELETE FROM "high_levels"
-                WHERE symbol = %s AND timeframe = %s AND id NOT IN %s
-            """, (symbol, timeframe, tuple(keep_ids)))
-            
-            self.conn.commit()
-            cursor.close()
-            logger.info(f"Filtered highs for {symbol} {timeframe}: kept {kept_count}, deleted {deleted_count}")
-        else:
-            logger.info(f"No highs to delete for {symbol} {timeframe}")
-        
-        return kept_count, deleted_count
+        return self._filter_levels(symbol, timeframe, 'high', cursor)
     
-    def filter_lows(self, symbol: str, timeframe: str):
+    def filter_lows(self, symbol: str, timeframe: str, cursor=None):
         """
         Filter low levels - most recent must be lowest
         Keep only levels that form increasing sequence from new to old
@@ -142,88 +175,78 @@ class LevelFilter:
         Returns:
             (kept_count, deleted_count)
         """
-        levels = self.get_levels(symbol, timeframe, 'low')
-        
-        if not levels:
-            logger.info("No low levels to filter")
-            return 0, 0
-        
-        logger.info(f"Filtering {len(levels)} low levels for {symbol} {timeframe}")
-        
-        keep_ids = []
-        levels_reversed = list(reversed(levels))
-        
-        # Keep most recent
-        most_recent_id, most_recent_level, most_recent_ts = levels_reversed[0]
-        keep_ids.append(most_recent_id)
-        min_kept = most_recent_level
-        logger.debug(f"Keeping most recent low: {most_recent_level:.2f} at {most_recent_ts}")
-        
-        # Go through older candles
-        for level_id, level, timestamp in levels_reversed[1:]:
-            if level < min_kept:
-                keep_ids.append(level_id)
-                min_kept = level
-                logger.debug(f"Keeping older low: {level:.2f} at {timestamp}")
-            else:
-                logger.debug(f"Deleting low: {level:.2f} at {timestamp} (not lower than {min_kept:.2f})")
-        
-        kept_count = len(keep_ids)
-        deleted_count = len(levels) - kept_count
-        
-        # Delete levels not in keep list
-        if deleted_count > 0:
-            cursor = self.conn.cursor()
-            cursor.execute("""
-                DELETE FROM "low_levels"
-                WHERE symbol = %s AND timeframe = %s AND id NOT IN %s
-            """, (symbol, timeframe, tuple(keep_ids)))
-            
-            self.conn.commit()
-            cursor.close()
-            logger.info(f"Filtered lows for {symbol} {timeframe}: kept {kept_count}, deleted {deleted_count}")
-        else:
-            logger.info(f"No lows to delete for {symbol} {timeframe}")
-        
-        return kept_count, deleted_count
+        return self._filter_levels(symbol, timeframe, 'low', cursor)
     
-    def filter_symbol_timeframe(self, symbol: str, timeframe: str):
+    def filter_symbol_timeframe(self, symbol: str, timeframe: str, cursor=None):
         """
         Filter both high and low levels for a symbol/timeframe
+        Both sides run in one transaction (one commit)
+        
+        Args:
+            symbol: e.g., 'btcusdt'
+            timeframe: 'daily', 'weekly', 'monthly'
+            cursor: Cursor of an open transaction to join, or None for its own
         
         Returns:
             dict with results: {'highs': (kept, deleted), 'lows': (kept, deleted)}
         """
-        logger.info(f"Filtering levels for {symbol} {timeframe}")
+        logger.info("Filtering levels for %s %s", symbol, timeframe)
         
-        highs = self.filter_highs(symbol, timeframe)
-        lows = self.filter_lows(symbol, timeframe)
+        with self._cursor(cursor) as cursor:
+            highs = self.filter_highs(symbol, timeframe, cursor)
+            lows = self.filter_lows(symbol, timeframe, cursor)
         
         return {
             'highs': highs,
             'lows': lows
         }
     
+    def filter_timeframe_bulk(self, symbols: List[str], timeframe: str, cursor=None):
+        """
+        Filter both high and low levels of several symbols for one timeframe
+        One statement per side for all symbols, both in one transaction (one commit)
+        
+        Args:
+            symbols: e.g., ['btcusdt', 'ethusdt']
+            timeframe: 'daily', 'weekly', 'monthly'
+            cursor: Cursor of an open transaction to join, or None for its own
+        
+        Returns:
+            dict of symbol -> {'highs': (kept, deleted), 'lows': (kept, deleted)}
+        """
+        logger.info("Filtering levels for %d symbols %s", len(symbols), timeframe)
+        
+        with self._cursor(cursor) as cursor:
+            highs = self._filter_levels_bulk(symbols, timeframe, 'high', cursor)
+            lows = self._filter_levels_bulk(symbols, timeframe, 'low', cursor)
+        
+        return {
+            symbol: {
+                'highs': highs[symbol],
+                'lows': lows[symbol]
+            }
+            for symbol in symbols
+        }
+    
     def filter_all(self):
         """
         Filter levels for all symbols and timeframes
         Processes: 7 symbols × 3 timeframes = 21 combinations
         """
-        symbols = ['btcusdt', 'ethusdt', 'ltcusdt', 'xrpusdt', 
-                   'dogeusdt', 'linkusdt', 'adausdt']
-        timeframes = ['daily', 'weekly', 'monthly']
+        combinations = [(symbol, timeframe) for symbol in SYMBOLS_DB for timeframe in TIMEFRAMES_HL]
+        
+        # Combinations touch disjoint rows, so they can be filtered side by side
+        with ThreadPoolExecutor(max_workers=self.FILTER_WORKERS) as executor:
+            filtered = list(executor.map(lambda combo: self.filter_symbol_timeframe(*combo), combinations))
         
         results = {}
         
-        for symbol in symbols:
-            results[symbol] = {}
-            for timeframe in timeframes:
-                print(f"\nFiltering {symbol} {timeframe}...")
-                result = self.filter_symbol_timeframe(symbol, timeframe)
-                results[symbol][timeframe] = result
-                
-                print(f"  Highs: kept {result['highs'][0]}, deleted {result['highs'][1]}")
-                print(f"  Lows: kept {result['lows'][0]}, deleted {result['lows'][1]}")
+        for (symbol, timeframe), result in zip(combinations, filtered):
+            results.setdefault(symbol, {})[timeframe] = result
+            
+            print(f"\nFiltered {symbol} {timeframe}")
+            print(f"  Highs: kept {result['highs'][0]}, deleted {result['highs'][1]}")
+            print(f"  Lows: kept {result['lows'][0]}, deleted {result['lows'][1]}")
         
         return results
 
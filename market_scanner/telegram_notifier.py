@@ -2,43 +2,61 @@
 Telegram notification system for fakeout alerts
 """
 
-import os
-import logging
 from telegram import Bot
 from telegram.error import TelegramError
 import asyncio
-from dotenv import load_dotenv
-
-# Load environment variables
-load_dotenv()
+import threading
+from typing import List
+from config import TELEGRAM_BOT_TOKEN, TELEGRAM_CHAT_ID, setup_logger
 
 # Setup logging
-os.makedirs('logs', exist_ok=True)
-logger = logging.getLogger(__name__)
-logger.setLevel(logging.INFO)
-
-fh = logging.FileHandler('logs/telegram.log')
-ch = logging.StreamHandler()
-formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
-fh.setFormatter(formatter)
-ch.setFormatter(formatter)
-logger.addHandler(fh)
-logger.addHandler(ch)
+logger = setup_logger(__name__, 'telegram.log')
 
 
 class TelegramNotifier:
     """Sends Telegram notifications for fakeouts"""
     
+    # Seconds to wait for one message to be delivered
+    SEND_TIMEOUT = 10
+    
+    # Telegram rejects longer message texts
+    MAX_MESSAGE_LENGTH = 4096
+    
     def __init__(self):
-        self.bot_token = os.getenv('TELEGRAM_BOT_TOKEN')
-        self.chat_id = os.getenv('TELEGRAM_CHAT_ID')
+        self.bot_token = TELEGRAM_BOT_TOKEN
+        self.chat_id = TELEGRAM_CHAT_ID
         
         if not self.bot_token or not self.chat_id:
             raise ValueError("TELEGRAM_BOT_TOKEN and TELEGRAM_CHAT_ID must be set in .env")
         
         self.bot = Bot(token=self.bot_token)
+        
+        # One event loop for the notifier's lifetime, so the bot's HTTP client
+        # (and its TLS connection to Telegram) is reused across alerts
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name='telegram-notifier', daemon=True)
+        self._thread.start()
+        
         logger.info("Telegram bot initialized")
     
+    def _run(self, coroutine):
+        """Run a coroutine on the notifier's loop and wait for its result"""
+        return asyncio.run_coroutine_threadsafe(coroutine, self._loop).result(timeout=self.SEND_TIMEOUT)
+    
+    def close(self):
+        """Close the bot's HTTP client and stop the event loop"""
+        if self._loop.is_closed():
+            return
+        
+        try:
+            self._run(self.bot.shutdown())
+        except Exception as e:
+            logger.warning(f"Error shutting down Telegram bot: {e}")
+        
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop.close()
+    
     async def send_message(self, message: str):
         """
         Send a message to Telegram
@@ -58,10 +76,10 @@ class TelegramNotifier:
             logger.error(f"Failed to send Telegram message: {e}")
             raise
     
-    def send_fakeout_alert(self, symbol: str, timeframe: str, fakeout_type: str, 
-                          level: float, candle: dict):
+    def format_fakeout(self, symbol: str, timeframe: str, fakeout_type: str, 
+                       level: float, candle: dict) -> str:
         """
-        Send a fakeout alert
+        Format one fakeout as an HTML message block
         
         Args:
             symbol: e.g., 'btcusdt'
@@ -77,8 +95,7 @@ class TelegramNotifier:
         emoji = "🔴" if fakeout_type == "high" else "🟢"
         direction = "HIGH" if fakeout_type == "high" else "LOW"
         
-        # Build message
-        message = f"""
+        return f"""
 {emoji} <b>FAKEOUT DETECTED</b> {emoji}
 
 <b>Symbol:</b> {symbol_display}
@@ -94,18 +111,58 @@ class TelegramNotifier:
 
 The price wicked {'above' if fakeout_type == 'high' else 'below'} ${level:,.2f} but closed {'below' if fakeout_type == 'high' else 'above'} it.
 """
+    
+    def send_fakeout_alert(self, symbol: str, timeframe: str, fakeout_type: str, 
+                          level: float, candle: dict):
+        """
+        Send a fakeout alert
+        
+        Args:
+            symbol: e.g., 'btcusdt'
+            timeframe: e.g., '1h', '4h', '1d'
+            fakeout_type: 'high' or 'low'
+            level: The level that was faked out
+            candle: Dict with OHLC data
+        """
+        message = self.format_fakeout(symbol, timeframe, fakeout_type, level, candle)
         
-        # Send async
+        # Send on the notifier's loop
         try:
-            asyncio.run(self.send_message(message))
+            self._run(self.send_message(message))
             logger.info(f"Fakeout alert sent for {symbol} {timeframe}")
         except Exception as e:
             logger.error(f"Failed to send fakeout alert: {e}")
     
+    def send_fakeout_batch(self, alerts: List[dict]):
+        """
+        Send several fakeout alerts as few messages as possible
+        Blocks are packed into messages of up to MAX_MESSAGE_LENGTH characters
+        
+        Args:
+            alerts: dicts with symbol, timeframe, fakeout_type, level and candle
+        """
+        messages = []
+        for alert in alerts:
+            block = self.format_fakeout(alert['symbol'], alert['timeframe'], alert['fakeout_type'],
+                                        alert['level'], alert['candle'])
+            if messages and len(messages[-1]) + len(block) <= self.MAX_MESSAGE_LENGTH:
+                messages[-1] += block
+            else:
+                messages.append(block)
+        
+        for message in messages:
+            try:
+                self._run(self.send_message(message))
+            except Exception as e:
+                logger.error(f"Failed to send fakeout alerts: {e}")
+        
+        if alerts:
+            logger.info(f"{len(alerts)} fakeout alerts sent in {len(messages)} messages")
+    
     def send_test_message(self):
         """Send a test message to verify bot is working"""
         message = "🤖 <b>Test Message</b>\n\nYour Telegram bot is working correctly!"
-        asyncio.run(self.send_message(message))
+        self._run(self.send_message(message))
 
 
 def test_telegram():
@@ -131,6 +188,8 @@ def test_telegram():
         notifier.send_fakeout_alert('btcusdt', '1h', 'high', 90961.81, fake_candle)
         print("✓ Fakeout alert sent!")
         
+        notifier.close()
+        
     except Exception as e:
         print(f"✗ Error: {e}")
     
@@ -3,18 +3,49 @@ from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse, HTMLResponse
 from fastapi.templating import Jinja2Templates
 from fastapi.staticfiles import StaticFiles
-from typing import Optional, List
+from typing import Annotated, Literal, Optional, List, Tuple
 from datetime import datetime, timedelta, timezone
 import os
 from dotenv import load_dotenv
-import psycopg2
+from pydantic import BeforeValidator
+import orjson
 from psycopg2.extras import RealDictCursor
-from contextlib import contextmanager
+from psycopg2.pool import ThreadedConnectionPool
+from contextlib import asynccontextmanager, contextmanager
+from functools import lru_cache, wraps
+from anyio import to_thread
+import threading
+import time
 
 # Load environment variables
 load_dotenv()
 
-app = FastAPI(title="Crypto Fakeout Scanner API", version="1.0.0")
+class OrjsonResponse(JSONResponse):
+    """
+    JSON response encoded by orjson (floats and datetimes natively, in C)
+    Endpoints returning rows return it directly, which also skips FastAPI's
+    per-value jsonable_encoder pass; timestamps are left as datetimes and come
+    out as the same ISO 8601 strings isoformat() gives
+    """
+    
+    def render(self, content) -> bytes:
+        return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_NAIVE_UTC)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Cap the worker threads on startup and close the pool on shutdown"""
+    limit_worker_threads()
+    yield
+    close_pool()
+
+
+app = FastAPI(
+    title="Crypto Fakeout Scanner API",
+    version="1.0.0",
+    default_response_class=OrjsonResponse,
+    lifespan=lifespan
+)
 
 # Templates and Static Files
 templates = Jinja2Templates(directory="templates")
@@ -32,18 +63,254 @@ app.add_middleware(
 # Database configuration
 DB_URL = os.getenv("DB_URL")
 
-SYMBOLS = ["btcusdt", "ethusdt", "ltcusdt", "xrpusdt", "dogeusdt", "linkusdt", "adausdt"]
-TIMEFRAMES = ["1h", "4h", "1d"]
+# Tuples for ordered iteration, frozensets for membership tests
+SYMBOLS = ("btcusdt", "ethusdt", "ltcusdt", "xrpusdt", "dogeusdt", "linkusdt", "adausdt")
+TIMEFRAMES = ("1h", "4h", "1d")
+DB_STATS_TIMEFRAMES = ("5m", "1h", "4h", "1d", "1w", "1M")
+SYMBOLS_SET = frozenset(SYMBOLS)
+TIMEFRAMES_SET = frozenset(TIMEFRAMES)
+
+# Path/query parameter types: FastAPI rejects anything else (422) while parsing
+# the request, before the handler runs; symbols are matched case-insensitively
+Symbol = Annotated[Literal[SYMBOLS], BeforeValidator(str.lower)]
+CandleTimeframe = Literal[DB_STATS_TIMEFRAMES]
+FakeoutTimeframe = Literal[TIMEFRAMES]
+
+
+# SQL over the fixed SYMBOLS/TIMEFRAMES tables, built once at import instead of per request
+def _fakeout_query(symbol: str, timeframe: str) -> str:
+    """Fakeout candles of one table, tagged with its symbol and timeframe"""
+    return f"""
+        SELECT 
+            id,
+            timestamp,
+            open,
+            high,
+            low,
+            close,
+            volume,
+            rsi_8,
+            ema_20,
+            ema_50,
+            fakeout_type,
+            fakeout_level,
+            '{symbol}' as symbol,
+            '{timeframe}' as timeframe
+        FROM "{symbol}_{timeframe}"
+        WHERE is_fakeout = TRUE
+    """
+
+
+def _fakeout_stats_query(symbol: str, timeframe: str) -> str:
+    """Fakeout counts of one table since today/week/month start (3 params)"""
+    return f"""
+        SELECT 
+            '{symbol}' as symbol,
+            '{timeframe}' as timeframe,
+            COUNT(*) FILTER (WHERE timestamp >= %s) as today,
+            COUNT(*) FILTER (WHERE timestamp >= %s) as week,
+            COUNT(*) FILTER (WHERE timestamp >= %s) as month,
+            COUNT(*) as total
+        FROM "{symbol}_{timeframe}"
+        WHERE is_fakeout = TRUE
+    """
+
+
+def _db_stats_query(symbol: str, timeframe: str) -> str:
+    """Candle and fakeout counts of one table"""
+    # Only the fakeout timeframes have an is_fakeout column
+    fakeout_count = "COUNT(*) FILTER (WHERE is_fakeout = TRUE)" if timeframe in TIMEFRAMES_SET else "0"
+    return f"""
+        SELECT '{symbol}' as symbol, '{timeframe}' as timeframe,
+               COUNT(*) as count, {fakeout_count} as fakeouts
+        FROM "{symbol}_{timeframe}"
+    """
+
+
+def _fakeout_branch(query: str) -> str:
+    """
+    One UNION ALL branch of get_fakeouts, cut to its newest limit + offset rows
+    (1 param) so the outer ORDER BY ... LIMIT only merges a few rows per table
+    """
+    return f"({query} ORDER BY timestamp DESC LIMIT %s)"
+
+
+FAKEOUT_QUERIES = {(sym, tf): _fakeout_query(sym, tf) for sym in SYMBOLS for tf in TIMEFRAMES}
+
+
+@lru_cache(maxsize=None)
+def _fakeouts_page_query(symbol: Optional[str], timeframe: Optional[str], with_type: bool) -> Tuple[str, int]:
+    """
+    Full get_fakeouts query for one filter combination, built on first use
+    Each branch takes (fakeout_type if with_type, limit + offset), then the
+    outer query takes (limit, offset)
+    
+    Args:
+        symbol: Known symbol, or None for all
+        timeframe: Known fakeout timeframe, or None for all
+        with_type: Whether branches filter on fakeout_type
+    
+    Returns:
+        (query text, number of UNION ALL branches)
+    """
+    branches = []
+    for sym in ([symbol] if symbol else SYMBOLS):
+        for tf in ([timeframe] if timeframe else TIMEFRAMES):
+            query = FAKEOUT_QUERIES[(sym, tf)]
+            
+            # Type filter is bound, never pasted into the SQL
+            if with_type:
+                query += " AND fakeout_type = %s"
+            
+            branches.append(_fakeout_branch(query))
+    
+    # Wrapped so a single parenthesized branch can still take the outer ORDER BY
+    full_query = f"""
+        SELECT * FROM ({" UNION ALL ".join(branches)}) AS fakeouts
+        ORDER BY timestamp DESC LIMIT %s OFFSET %s
+    """
+    return full_query, len(branches)
+
+
+# Unfiltered case (the dashboard's default request) built at import
+_fakeouts_page_query(None, None, False)
+
+FAKEOUT_STATS_PARTS = [_fakeout_stats_query(sym, tf) for sym in SYMBOLS for tf in TIMEFRAMES]
+FAKEOUT_STATS_QUERY = " UNION ALL ".join(FAKEOUT_STATS_PARTS)
+
+# Hot per-table lookups, run as prepared statements (see execute_prepared)
+# (symbol, timeframe) -> statement, with $n placeholders
+CANDLES_STATEMENTS = {
+    (sym, tf): f"""
+        SELECT timestamp, open, high, low, close, volume, rsi_8, ema_20, ema_50
+        FROM "{sym}_{tf}"
+        ORDER BY timestamp DESC
+        LIMIT $1
+    """
+    for sym in SYMBOLS for tf in DB_STATS_TIMEFRAMES
+}
+
+# Context candles around a fakeout: timeframe -> (context timeframe, before, after)
+# (4h fakeouts have no context by design)
+CONTEXT_WINDOWS = {
+    "1h": ("5m", "1 hour", "2 hours"),
+    "1d": ("1h", "24 hours", "24 hours")
+}
+
+CONTEXT_COLUMNS = ["timestamp", "open", "high", "low", "close", "volume"]
+
+
+def _fakeout_detail_statement(symbol: str, timeframe: str) -> str:
+    """
+    A fakeout row and its context candles in one round trip ($1 = id)
+    row_type tells them apart; 'fakeout' sorts before 'context' (DESC), then candles by time
+    """
+    fakeout = f"""
+        WITH f AS (
+            SELECT 
+                id, timestamp, open, high, low, close, volume,
+                rsi_8, ema_20, ema_50, fakeout_type, fakeout_level,
+                '{symbol}' as symbol, '{timeframe}' as timeframe
+            FROM "{symbol}_{timeframe}"
+            WHERE id = $1 AND is_fakeout = TRUE
+        )
+        SELECT 'fakeout' as row_type, f.* FROM f
+    """
+    
+    if timeframe not in CONTEXT_WINDOWS:
+        return fakeout
+    
+    context_tf, before, after = CONTEXT_WINDOWS[timeframe]
+    return fakeout + f"""
+        UNION ALL
+        SELECT 
+            'context', NULL, c.timestamp, c.open, c.high, c.low, c.close, c.volume,
+            NULL, NULL, NULL, NULL, NULL, NULL, NULL
+        FROM "{symbol}_{context_tf}" c, f
+        WHERE c.timestamp BETWEEN f.timestamp - interval '{before}' AND f.timestamp + interval '{after}'
+        ORDER BY row_type DESC, timestamp
+    """
+
+
+FAKEOUT_DETAIL_STATEMENTS = {
+    (sym, tf): _fakeout_detail_statement(sym, tf)
+    for sym in SYMBOLS for tf in TIMEFRAMES
+}
+
+DB_STATS_QUERY = " UNION ALL ".join(
+    [_db_stats_query(sym, tf) for sym in SYMBOLS for tf in DB_STATS_TIMEFRAMES] +
+    [f"""
+        SELECT NULL as symbol, '{table_name}' as timeframe,
+               COUNT(*) as count, 0 as fakeouts
+        FROM "{table_name}"
+    """ for table_name in ["high_levels", "low_levels"]]
+)
+
+# Server worker processes (python main.py), one per core by default
+WEB_WORKERS = int(os.getenv("WEB_WORKERS", os.cpu_count() or 1))
+
+# Connection pool (per worker process), created on first request so a forked
+# worker never inherits a parent's connections; by default the workers split
+# DB_CONNECTION_BUDGET connections between them
+POOL_MIN = int(os.getenv("DB_POOL_MIN", "2"))
+DB_CONNECTION_BUDGET = int(os.getenv("DB_CONNECTION_BUDGET", "64"))
+POOL_MAX = int(os.getenv("DB_POOL_MAX", max(POOL_MIN, DB_CONNECTION_BUDGET // WEB_WORKERS)))
+
+# How long /api/status and /api/fakeouts/stats answers are reused
+STATUS_CACHE_SECONDS = 5
+STATS_CACHE_SECONDS = 5
+
+_pool = None
+_pool_lock = threading.Lock()
+
+# Names PREPAREd on each pooled connection (prepared statements live per session)
+_prepared = {}
+
+
+def get_pool() -> ThreadedConnectionPool:
+    """Get the process-wide connection pool, creating it on first use"""
+    global _pool
+    with _pool_lock:
+        if _pool is None or _pool.closed:
+            _pool = ThreadedConnectionPool(POOL_MIN, POOL_MAX, DB_URL)
+        return _pool
+
+
+def limit_worker_threads():
+    """
+    Endpoints are plain `def` so FastAPI runs their blocking psycopg2 calls in
+    its worker threads instead of on the event loop; cap those threads at the
+    pool size so a request never finds the pool exhausted
+    """
+    to_thread.current_default_thread_limiter().total_tokens = POOL_MAX
+
+
+def close_pool():
+    """Close every pooled connection when the server stops"""
+    with _pool_lock:
+        if _pool is not None and not _pool.closed:
+            _pool.closeall()
+        _prepared.clear()
 
 
 @contextmanager
 def get_db_connection():
-    """Context manager for database connections"""
-    conn = psycopg2.connect(DB_URL)
+    """
+    Context manager for database connections (borrowed from the pool)
+    Wrap only the queries: formatting and the response are built after the
+    connection is back in the pool, so it's free for the next request sooner
+    """
+    pool = get_pool()
+    conn = pool.getconn()
     try:
+        # Read-only API: no transaction left open on the pooled connection
+        conn.autocommit = True
         yield conn
     finally:
-        conn.close()
+        # Broken connections are discarded instead of going back to the pool
+        if conn.closed:
+            _prepared.pop(conn, None)
+        pool.putconn(conn, close=bool(conn.closed))
 
 
 def execute_query(query: str, params: tuple = None, fetchone: bool = False):
@@ -51,40 +318,113 @@ def execute_query(query: str, params: tuple = None, fetchone: bool = False):
     with get_db_connection() as conn:
         with conn.cursor(cursor_factory=RealDictCursor) as cur:
             cur.execute(query, params)
+            # RealDictCursor rows already are dicts; returned as fetched, without a copy
             if fetchone:
-                return dict(cur.fetchone()) if cur.rowcount > 0 else None
-            return [dict(row) for row in cur.fetchall()]
+                return cur.fetchone() if cur.rowcount > 0 else None
+            return cur.fetchall()
+
+
+def ttl_cache(seconds: float):
+    """
+    Cache a no-argument endpoint's result for a few seconds
+    Dashboards polling at the same time share one computation; callers that
+    arrive while it runs wait for it instead of repeating the queries
+    Errors are not cached
+    """
+    def decorator(func):
+        lock = threading.Lock()
+        cached = {}  # 'value' -> (expires_at, result)
+        
+        @wraps(func)
+        def wrapper():
+            with lock:
+                entry = cached.get('value')
+                if entry is not None and entry[0] > time.monotonic():
+                    return entry[1]
+                
+                result = func()
+                cached['value'] = (time.monotonic() + seconds, result)
+                return result
+        
+        return wrapper
+    return decorator
+
+
+def execute_prepared(name: str, statement: str, params: tuple = (), fetchone: bool = False):
+    """
+    Execute a statement PREPAREd once per pooled connection
+    Repeated calls skip parse and plan on the server
+    
+    Args:
+        name: Prepared statement name
+        statement: SQL with $1, $2, ... placeholders
+        params: Values for the placeholders
+        fetchone: Return the first row only
+    """
+    with get_db_connection() as conn:
+        prepared = _prepared.setdefault(conn, set())
+        with conn.cursor(cursor_factory=RealDictCursor) as cur:
+            if name not in prepared:
+                cur.execute(f'PREPARE "{name}" AS {statement}')
+                prepared.add(name)
+            
+            placeholders = f"({', '.join(['%s'] * len(params))})" if params else ""
+            cur.execute(f'EXECUTE "{name}"{placeholders}', params)
+            if fetchone:
+                return cur.fetchone() if cur.rowcount > 0 else None
+            return cur.fetchall()
 
 
 @app.get("/api/status")
-async def get_status():
+@ttl_cache(STATUS_CACHE_SECONDS)
+def get_status():
     """System status and health check"""
     try:
+        # Connection held for the queries only; the response is built after it's returned
+        latest = {}
         with get_db_connection() as conn:
             with conn.cursor() as cur:
                 # Test DB connection
                 cur.execute("SELECT 1")
                 
                 # Get latest candle timestamps
-                latest_candles = {}
                 for symbol in SYMBOLS:
-                    cur.execute(f'SELECT timestamp FROM "{symbol}_5m" ORDER BY id DESC LIMIT 1')
-                    result = cur.fetchone()
-                    if result:
-                        latest_candles[symbol] = result[0].isoformat()
-                
-                return {
-                    "status": "healthy",
-                    "database": "connected",
-                    "latest_candles": latest_candles,
-                    "timestamp": datetime.now(timezone.utc).isoformat()
-                }
+                    cur.execute(f'SELECT timestamp FROM "{symbol}_5m" ORDER BY timestamp DESC LIMIT 1')
+                    latest[symbol] = cur.fetchone()
+        
+        latest_candles = {symbol: result[0].isoformat() for symbol, result in latest.items() if result}
+        
+        return {
+            "status": "healthy",
+            "database": "connected",
+            "latest_candles": latest_candles,
+            "timestamp": datetime.now(timezone.utc).isoformat()
+        }
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"System error: {str(e)}")
 
 
+def _fetch_fakeouts(symbol: Optional[str] = None, timeframe: Optional[str] = None,
+                    fakeout_type: Optional[str] = None, limit: int = 100, offset: int = 0) -> List[dict]:
+    """
+    Newest fakeouts across the symbol/timeframe tables, with optional filters
+    Shared by /api/fakeouts and /api/fakeouts/recent
+    """
+    # Unknown symbols/timeframes match no table (and never reach the query cache)
+    symbol = symbol.lower() if symbol else None
+    if (symbol and symbol not in SYMBOLS_SET) or (timeframe and timeframe not in TIMEFRAMES_SET):
+        return []
+    
+    full_query, branches = _fakeouts_page_query(symbol, timeframe or None, bool(fakeout_type))
+    
+    # No table can contribute more than limit + offset rows to the page
+    branch_params = (fakeout_type, limit + offset) if fakeout_type else (limit + offset,)
+    
+    return execute_query(full_query, branch_params * branches + (limit, offset))
+
+
 @app.get("/api/fakeouts")
-async def get_fakeouts(
+def get_fakeouts(
     symbol: Optional[str] = Query(None, description="Filter by symbol (e.g., btcusdt)"),
     timeframe: Optional[str] = Query(None, description="Filter by timeframe (1h, 4h, 1d)"),
     fakeout_type: Optional[str] = Query(None, description="Filter by type (high, low)"),
@@ -93,152 +433,40 @@ async def get_fakeouts(
 ):
     """Get all fakeouts with optional filters"""
     try:
-        # Build UNION query for all symbol/timeframe combinations
-        union_queries = []
-        
-        for sym in SYMBOLS:
-            # Apply symbol filter
-            if symbol and sym != symbol.lower():
-                continue
-                
-            for tf in TIMEFRAMES:
-                # Apply timeframe filter
-                if timeframe and tf != timeframe:
-                    continue
-                
-                table_name = f'"{sym}_{tf}"'
-                query = f"""
-                    SELECT 
-                        id,
-                        timestamp,
-                        open,
-                        high,
-                        low,
-                        close,
-                        volume,
-                        rsi_8,
-                        ema_20,
-                        ema_50,
-                        fakeout_type,
-                        fakeout_level,
-                        '{sym}' as symbol,
-                        '{tf}' as timeframe
-                    FROM {table_name}
-                    WHERE is_fakeout = TRUE
-                """
-                
-                # Apply type filter
-                if fakeout_type:
-                    query += f" AND fakeout_type = '{fakeout_type}'"
-                
-                union_queries.append(query)
-        
-        if not union_queries:
-            return {"fakeouts": [], "total": 0}
-        
-        # Combine with UNION ALL
-        full_query = " UNION ALL ".join(union_queries)
-        full_query += f" ORDER BY timestamp DESC LIMIT {limit} OFFSET {offset}"
-        
-        fakeouts = execute_query(full_query)
+        fakeouts = _fetch_fakeouts(symbol, timeframe, fakeout_type, limit, offset)
         
-        # Convert timestamps to ISO format
-        for fakeout in fakeouts:
-            if fakeout.get('timestamp'):
-                fakeout['timestamp'] = fakeout['timestamp'].isoformat()
-        
-        return {
+        return OrjsonResponse({
             "fakeouts": fakeouts,
             "total": len(fakeouts),
             "limit": limit,
             "offset": offset
-        }
+        })
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error fetching fakeouts: {str(e)}")
 
 
 @app.get("/api/fakeouts/recent")
-async def get_recent_fakeouts(limit: int = Query(10, description="Number of recent fakeouts")):
+def get_recent_fakeouts(limit: int = Query(10, description="Number of recent fakeouts")):
     """Get most recent fakeouts"""
-    return await get_fakeouts(limit=limit)
-
-
-@app.get("/api/fakeouts/{fakeout_id}")
-async def get_fakeout_detail(fakeout_id: int, symbol: str, timeframe: str):
-    """Get detailed information about a specific fakeout including context candles"""
     try:
-        symbol = symbol.lower()
-        table_name = f'"{symbol}_{timeframe}"'
-        
-        # Get the fakeout
-        query = f"""
-            SELECT 
-                id, timestamp, open, high, low, close, volume,
-                rsi_8, ema_20, ema_50, fakeout_type, fakeout_level,
-                '{symbol}' as symbol, '{timeframe}' as timeframe
-            FROM {table_name}
-            WHERE id = %s AND is_fakeout = TRUE
-        """
+        fakeouts = _fetch_fakeouts(limit=limit)
         
-        fakeout = execute_query(query, (fakeout_id,), fetchone=True)
-        
-        if not fakeout:
-            raise HTTPException(status_code=404, detail="Fakeout not found")
-        
-        fakeout_timestamp = fakeout['timestamp']
-        
-        # Get context candles based on timeframe
-        context_candles = []
-        
-        if timeframe == "1h":
-            # Get 5m candles: 1hr before and 2hr after
-            context_table = f'"{symbol}_5m"'
-            start_time = fakeout_timestamp - timedelta(hours=1)
-            end_time = fakeout_timestamp + timedelta(hours=2)
-            
-            context_query = f"""
-                SELECT timestamp, open, high, low, close, volume
-                FROM {context_table}
-                WHERE timestamp BETWEEN %s AND %s
-                ORDER BY timestamp
-            """
-            context_candles = execute_query(context_query, (start_time, end_time))
-            
-        elif timeframe == "1d":
-            # Get 1h candles: 24hr before and 24hr after
-            context_table = f'"{symbol}_1h"'
-            start_time = fakeout_timestamp - timedelta(hours=24)
-            end_time = fakeout_timestamp + timedelta(hours=24)
-            
-            context_query = f"""
-                SELECT timestamp, open, high, low, close, volume
-                FROM {context_table}
-                WHERE timestamp BETWEEN %s AND %s
-                ORDER BY timestamp
-            """
-            context_candles = execute_query(context_query, (start_time, end_time))
-        
-        # Note: 4h fakeouts have no context by design
-        
-        # Convert timestamps
-        fakeout['timestamp'] = fakeout['timestamp'].isoformat()
-        for candle in context_candles:
-            candle['timestamp'] = candle['timestamp'].isoformat()
-        
-        return {
-            "fakeout": fakeout,
-            "context_candles": context_candles
-        }
+        return OrjsonResponse({
+            "fakeouts": fakeouts,
+            "total": len(fakeouts),
+            "limit": limit,
+            "offset": 0
+        })
         
-    except HTTPException:
-        raise
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error fetching fakeout detail: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Error fetching recent fakeouts: {str(e)}")
 
 
+# Declared before /api/fakeouts/{fakeout_id}, which would otherwise match "stats" as an id
 @app.get("/api/fakeouts/stats")
-async def get_fakeout_stats():
+@ttl_cache(STATS_CACHE_SECONDS)
+def get_fakeout_stats():
     """Get summary statistics for fakeouts"""
     try:
         now = datetime.now(timezone.utc)
@@ -261,33 +489,18 @@ async def get_fakeout_stats():
         for tf in TIMEFRAMES:
             stats["by_timeframe"][tf] = 0
         
-        # Query each table
-        for symbol in SYMBOLS:
-            for tf in TIMEFRAMES:
-                table_name = f'"{symbol}_{tf}"'
-                
-                # Count by time period
-                query = f"""
-                    SELECT 
-                        COUNT(*) FILTER (WHERE timestamp >= %s) as today,
-                        COUNT(*) FILTER (WHERE timestamp >= %s) as week,
-                        COUNT(*) FILTER (WHERE timestamp >= %s) as month,
-                        COUNT(*) as total
-                    FROM {table_name}
-                    WHERE is_fakeout = TRUE
-                """
-                
-                result = execute_query(query, (today_start, week_start, month_start), fetchone=True)
-                
-                if result:
-                    stats["today"] += result["today"] or 0
-                    stats["week"] += result["week"] or 0
-                    stats["month"] += result["month"] or 0
-                    
-                    # Add to symbol and timeframe totals
-                    total = result["total"] or 0
-                    stats["by_symbol"][symbol.upper()] += total
-                    stats["by_timeframe"][tf] += total
+        # Count by time period in every table, one UNION ALL query (one round trip)
+        results = execute_query(FAKEOUT_STATS_QUERY, (today_start, week_start, month_start) * len(FAKEOUT_STATS_PARTS))
+        
+        for result in results:
+            stats["today"] += result["today"] or 0
+            stats["week"] += result["week"] or 0
+            stats["month"] += result["month"] or 0
+            
+            # Add to symbol and timeframe totals
+            total = result["total"] or 0
+            stats["by_symbol"][result["symbol"].upper()] += total
+            stats["by_timeframe"][result["timeframe"]] += total
         
         return stats
         
@@ -295,39 +508,49 @@ async def get_fakeout_stats():
         raise HTTPException(status_code=500, detail=f"Error calculating stats: {str(e)}")
 
 
+@app.get("/api/fakeouts/{fakeout_id}")
+def get_fakeout_detail(fakeout_id: int, symbol: Symbol, timeframe: FakeoutTimeframe):
+    """Get detailed information about a specific fakeout including context candles"""
+    try:
+        # Get the fakeout and its context candles (one statement, see CONTEXT_WINDOWS)
+        rows = execute_prepared(
+            f"fakeout_{symbol}_{timeframe}", FAKEOUT_DETAIL_STATEMENTS[(symbol, timeframe)], (fakeout_id,)
+        )
+        
+        if not rows:
+            raise HTTPException(status_code=404, detail="Fakeout not found")
+        
+        fakeout = rows[0]
+        del fakeout['row_type']
+        context_candles = [{col: row[col] for col in CONTEXT_COLUMNS} for row in rows[1:]]
+        
+        return OrjsonResponse({
+            "fakeout": fakeout,
+            "context_candles": context_candles
+        })
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error fetching fakeout detail: {str(e)}")
+
+
 @app.get("/api/candles/{symbol}/{timeframe}")
-async def get_candles(
-    symbol: str,
-    timeframe: str,
+def get_candles(
+    symbol: Symbol,
+    timeframe: CandleTimeframe,
     limit: int = Query(100, description="Number of candles to return")
 ):
     """Get OHLCV candles for a symbol/timeframe"""
     try:
-        symbol = symbol.lower()
-        if symbol not in SYMBOLS:
-            raise HTTPException(status_code=400, detail="Invalid symbol")
-        if timeframe not in ["5m", "1h", "4h", "1d", "1w", "1M"]:
-            raise HTTPException(status_code=400, detail="Invalid timeframe")
-        
-        table_name = f'"{symbol}_{timeframe}"'
-        
-        query = f"""
-            SELECT timestamp, open, high, low, close, volume, rsi_8, ema_20, ema_50
-            FROM {table_name}
-            ORDER BY id DESC
-            LIMIT %s
-        """
-        
-        candles = execute_query(query, (limit,))
+        candles = execute_prepared(
+            f"candles_{symbol}_{timeframe}", CANDLES_STATEMENTS[(symbol, timeframe)], (limit,)
+        )
         
         # Reverse to chronological order
         candles.reverse()
         
-        # Convert timestamps
-        for candle in candles:
-            candle['timestamp'] = candle['timestamp'].isoformat()
-        
-        return {"symbol": symbol, "timeframe": timeframe, "candles": candles}
+        return OrjsonResponse({"symbol": symbol, "timeframe": timeframe, "candles": candles})
         
     except HTTPException:
         raise
@@ -336,27 +559,18 @@ async def get_candles(
 
 
 @app.get("/api/candles/{symbol}/{timeframe}/latest")
-async def get_latest_candle(symbol: str, timeframe: str):
+def get_latest_candle(symbol: Symbol, timeframe: CandleTimeframe):
     """Get the latest candle for a symbol/timeframe"""
     try:
-        symbol = symbol.lower()
-        table_name = f'"{symbol}_{timeframe}"'
-        
-        query = f"""
-            SELECT timestamp, open, high, low, close, volume, rsi_8, ema_20, ema_50
-            FROM {table_name}
-            ORDER BY id DESC
-            LIMIT 1
-        """
-        
-        candle = execute_query(query, fetchone=True)
+        # Same statement as get_candles, limited to one row
+        candle = execute_prepared(
+            f"candles_{symbol}_{timeframe}", CANDLES_STATEMENTS[(symbol, timeframe)], (1,), fetchone=True
+        )
         
         if not candle:
             raise HTTPException(status_code=404, detail="No candles found")
         
-        candle['timestamp'] = candle['timestamp'].isoformat()
-        
-        return {"symbol": symbol, "timeframe": timeframe, "candle": candle}
+        return OrjsonResponse({"symbol": symbol, "timeframe": timeframe, "candle": candle})
         
     except HTTPException:
         raise
@@ -364,14 +578,39 @@ async def get_latest_candle(symbol: str, timeframe: str):
         raise HTTPException(status_code=500, detail=f"Error fetching latest candle: {str(e)}")
 
 
+# Declared before /api/levels/{symbol}, which would otherwise match "all" as a symbol
+@app.get("/api/levels/all")
+def get_all_levels():
+    """Get all levels for all symbols"""
+    try:
+        all_levels = {
+            symbol.upper(): {"high_levels": [], "low_levels": []}
+            for symbol in SYMBOLS
+        }
+        
+        # One query per levels table for every symbol, bucketed by symbol below
+        for table_name in ["high_levels", "low_levels"]:
+            query = f"""
+                SELECT symbol, level, timestamp, timeframe
+                FROM "{table_name}"
+                WHERE symbol = ANY(%s)
+                ORDER BY timestamp DESC
+            """
+            
+            for level in execute_query(query, (list(SYMBOLS),)):
+                symbol = level.pop('symbol')
+                all_levels[symbol.upper()][table_name].append(level)
+        
+        return OrjsonResponse(all_levels)
+        
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error fetching all levels: {str(e)}")
+
+
 @app.get("/api/levels/{symbol}")
-async def get_levels(symbol: str, timeframe: Optional[str] = Query(None, description="daily, weekly, or monthly")):
+def get_levels(symbol: Symbol, timeframe: Optional[str] = Query(None, description="daily, weekly, or monthly")):
     """Get filtered high and low levels for a symbol"""
     try:
-        symbol = symbol.lower()
-        if symbol not in SYMBOLS:
-            raise HTTPException(status_code=400, detail="Invalid symbol")
-        
         # Query high levels
         high_query = """
             SELECT level, timestamp, timeframe
@@ -404,17 +643,11 @@ async def get_levels(symbol: str, timeframe: Optional[str] = Query(None, descrip
         
         low_levels = execute_query(low_query, tuple(params))
         
-        # Convert timestamps
-        for level in high_levels:
-            level['timestamp'] = level['timestamp'].isoformat()
-        for level in low_levels:
-            level['timestamp'] = level['timestamp'].isoformat()
-        
-        return {
+        return OrjsonResponse({
             "symbol": symbol,
             "high_levels": high_levels,
             "low_levels": low_levels
-        }
+        })
         
     except HTTPException:
         raise
@@ -422,61 +655,25 @@ async def get_levels(symbol: str, timeframe: Optional[str] = Query(None, descrip
         raise HTTPException(status_code=500, detail=f"Error fetching levels: {str(e)}")
 
 
-@app.get("/api/levels/all")
-async def get_all_levels():
-    """Get all levels for all symbols"""
-    try:
-        all_levels = {}
-        
-        for symbol in SYMBOLS:
-            result = await get_levels(symbol)
-            all_levels[symbol.upper()] = {
-                "high_levels": result["high_levels"],
-                "low_levels": result["low_levels"]
-            }
-        
-        return all_levels
-        
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error fetching all levels: {str(e)}")
-
-
 @app.get("/api/db/stats")
-async def get_db_stats():
+def get_db_stats():
     """Get database statistics (table sizes, record counts)"""
     try:
         stats = {}
         
-        with get_db_connection() as conn:
-            with conn.cursor(cursor_factory=RealDictCursor) as cur:
-                for symbol in SYMBOLS:
-                    stats[symbol.upper()] = {}
-                    for tf in ["5m", "1h", "4h", "1d", "1w", "1M"]:
-                        table_name = f'"{symbol}_{tf}"'
-                        
-                        # Get count
-                        cur.execute(f"SELECT COUNT(*) as count FROM {table_name}")
-                        count = cur.fetchone()["count"]
-                        
-                        # Get fakeout count
-                        cur.execute(f"SELECT COUNT(*) as count FROM {table_name} WHERE is_fakeout = TRUE")
-                        fakeout_count = cur.fetchone()["count"]
-                        
-                        stats[symbol.upper()][tf] = {
-                            "total_candles": count,
-                            "fakeouts": fakeout_count
-                        }
-                
-                # Get level counts
-                cur.execute('SELECT COUNT(*) as count FROM "high_levels"')
-                high_level_count = cur.fetchone()["count"]
-                
-                cur.execute('SELECT COUNT(*) as count FROM "low_levels"')
-                low_level_count = cur.fetchone()["count"]
-                
-                stats["levels"] = {
-                    "high_levels": high_level_count,
-                    "low_levels": low_level_count
+        for symbol in SYMBOLS:
+            stats[symbol.upper()] = {}
+        stats["levels"] = {}
+        
+        # Candle and fakeout counts of every table plus the level counts in one
+        # UNION ALL query (one round trip instead of one per count)
+        for row in execute_query(DB_STATS_QUERY):
+            if row["symbol"] is None:
+                stats["levels"][row["timeframe"]] = row["count"]
+            else:
+                stats[row["symbol"].upper()][row["timeframe"]] = {
+                    "total_candles": row["count"],
+                    "fakeouts": row["fakeouts"]
                 }
         
         return stats
@@ -485,14 +682,22 @@ async def get_db_stats():
         raise HTTPException(status_code=500, detail=f"Error fetching DB stats: {str(e)}")
 
 
+@lru_cache(maxsize=1)
+def render_spa() -> str:
+    """Render index.html once; the SPA shell is the same for every request"""
+    return templates.get_template("index.html").render()
+
+
 # Serve the SPA (MUST BE LAST - catch-all route)
 @app.get("/", response_class=HTMLResponse)
 @app.get("/{full_path:path}", response_class=HTMLResponse)
 async def serve_spa(request: Request, full_path: str = ""):
     """Serve the single-page application for all non-API routes"""
-    return templates.TemplateResponse("index.html", {"request": request})
+    return HTMLResponse(render_spa())
 
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
+    # Workers are separate processes (no shared GIL), so the import string form is required;
+    # under gunicorn: gunicorn -w $WEB_WORKERS -k uvicorn.workers.UvicornWorker main:app
+    uvicorn.run("main:app", host="0.0.0.0", port=8000, workers=WEB_WORKERS)
\ No newline at end of file